@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, HTTPException
+from app.core.config import settings
+from app.models.auth_models import UserIdentity
+from app.api import auth
+from app.services import embedding_service, tavily_service, vector_index
+from app.services.answer_cache import answer_cache
+from app.services.history_buffer import history_buffer
+from app.services.message_writer import message_writer
+from app.services.rate_limiter import anonymous_limiter
+from app.services.session_vector_cache import session_vector_cache
+from app.services.stream_registry import stream_registry
+import logging
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+async def require_admin(current_user: UserIdentity = Depends(auth.get_current_user)) -> UserIdentity:
+    """Allows only users listed in ADMIN_CLERK_USER_IDS."""
+    if current_user.clerk_user_id not in settings.ADMIN_CLERK_USER_IDS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+@router.get("/cache-stats", response_model=dict)
+async def get_cache_stats(admin: UserIdentity = Depends(require_admin)):
+    """Reports hit/miss counters for the in-process caches."""
+    return {
+        "auth": auth.get_auth_cache_stats(),
+        "session_vectors": session_vector_cache.stats(),
+        "tavily": tavily_service.get_cache_stats(),
+        "answers": answer_cache.stats(),
+        "history": history_buffer.stats(),
+        "streams": stream_registry.stats(),
+    }
+
+@router.get("/embedding-stats", response_model=dict)
+async def get_embedding_stats(admin: UserIdentity = Depends(require_admin)):
+    """Reports batch fill and queueing delay for the embedding dispatcher."""
+    return embedding_service.get_embedding_stats()
+
+@router.get("/message-writer-stats", response_model=dict)
+async def get_message_writer_stats(admin: UserIdentity = Depends(require_admin)):
+    """Reports the backlog and failures of the write-behind chat message writer."""
+    return message_writer.stats()
+
+@router.get("/rate-limit-stats", response_model=dict)
+async def get_rate_limit_stats(admin: UserIdentity = Depends(require_admin)):
+    """Reports the backend and tracked keys of the anonymous message limiter."""
+    return await anonymous_limiter.stats()
+
+@router.get("/vector-index", response_model=dict)
+async def get_vector_index_status(admin: UserIdentity = Depends(require_admin)):
+    """Reports the ANN index on document_chunks: size, validity and build progress."""
+    try:
+        return await vector_index.get_index_status()
+    except Exception as e:
+        logger.error(f"Error reading vector index status: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to read vector index status: {str(e)}")
+
+@router.post("/vector-index/rebuild", status_code=202, response_model=dict)
+async def rebuild_vector_index(admin: UserIdentity = Depends(require_admin)):
+    """Drops and rebuilds the ANN index concurrently in the background."""
+    if not vector_index.start_index_build(rebuild=True):
+        raise HTTPException(status_code=409, detail="A vector index build is already running")
+    return {"status": "building"}
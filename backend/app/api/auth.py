@@ -1,13 +1,17 @@
+import hashlib
 import logging
+import time
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from app.core.database import get_db
 from app.models import db_models
+from app.models.auth_models import UserIdentity
 from app.core.config import settings
-import requests
-from jose import jwt, jwk
+from app.core.cache import LRUCache
+from app.core.jwks import jwks_store
+from jose import jwt
 from jose.exceptions import JWTError
 
 logger = logging.getLogger(__name__)
@@ -16,25 +20,22 @@ router = APIRouter()
 
 # Set up Clerk URLs based on your settings
 CLERK_ISSUER = settings.CLERK_ISSUER
-CLERK_JWKS_URL = settings.CLERK_JWKS_ENDPOINT
 
-def get_jwks():
-    """Fetch the JSON Web Key Set from Clerk"""
+async def get_public_key(kid):
+    """Get the cached signing key for the given key ID"""
     try:
-        response = requests.get(CLERK_JWKS_URL)
-        response.raise_for_status()
-        return response.json()
+        signing_key = await jwks_store.get_key(kid)
     except Exception as e:
+        # Clerk is unreachable and there are no cached keys to fall back on
         logger.error(f"Failed to fetch JWKS: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch authentication keys")
-
-def get_public_key(kid):
-    """Get the public key for the given key ID"""
-    jwks = get_jwks()
-    for key in jwks.get('keys', []):
-        if key.get('kid') == kid:
-            return jwk.construct(key)
-    raise HTTPException(status_code=401, detail="Invalid token key ID")
+        raise HTTPException(
+            status_code=503,
+            detail="Authentication is temporarily unavailable",
+            headers={"Retry-After": "5"}
+        )
+    if signing_key is None:
+        raise HTTPException(status_code=401, detail="Invalid token key ID")
+    return signing_key
 
 async def verify_jwt(token):
     """Verify the JWT token using Clerk's public keys"""
@@ -45,19 +46,21 @@ async def verify_jwt(token):
         if not kid:
             raise HTTPException(status_code=401, detail="Missing key ID in token header")
         
-        public_key = get_public_key(kid)
+        public_key = await get_public_key(kid)
         
         # Decode and verify the token
         payload = jwt.decode(
             token, 
-            public_key.to_pem().decode('utf-8'),
+            public_key.key,
             algorithms=['RS256'],
             audience=settings.CLERK_JWT_AUDIENCE,
             issuer=CLERK_ISSUER
         )
         
-        logger.info(f"Token verification successful for user: {payload.get('sub')}")
+        logger.debug(f"Token verification successful for user: {payload.get('sub')}")
         return payload
+    except HTTPException:
+        raise
     except JWTError as e:
         logger.error(f"Token verification failed: {e}")
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
@@ -65,44 +68,76 @@ async def verify_jwt(token):
         logger.error(f"Token verification failed: {e}")
         raise HTTPException(status_code=401, detail="Token verification failed")
 
-async def get_current_user(authorization: str = Header(None), db = Depends(get_db)) -> db_models.User:
+# Verified tokens map to their Clerk user ID until the token expires
+_token_cache = LRUCache(max_entries=settings.AUTH_TOKEN_CACHE_SIZE)
+# Clerk user ID -> UserIdentity, so cached tokens also skip the users lookup
+_user_cache = LRUCache(max_entries=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_TTL_SECONDS)
+
+def invalidate_user(clerk_user_id: str):
+    """Drop a cached user row, e.g. after its profile changes."""
+    _user_cache.pop(clerk_user_id)
+
+def get_auth_cache_stats() -> dict:
+    return {"tokens": _token_cache.stats(), "users": _user_cache.stats()}
+
+async def _get_clerk_user_id(token: str) -> tuple[str, Optional[str]]:
+    """Returns (clerk_user_id, email) for a token, verifying it only on a cache miss."""
+    token_key = hashlib.sha256(token.encode("utf-8")).digest()
+    cached = _token_cache.get(token_key)
+    if cached is not None:
+        return cached
+
+    payload = await verify_jwt(token)
+
+    clerk_user_id = payload.get('sub')
+    if not clerk_user_id:
+        raise HTTPException(status_code=401, detail="User ID not found in token")
+
+    claims = (clerk_user_id, payload.get('email'))
+    exp = payload.get('exp')
+    if exp:
+        ttl = min(exp - time.time(), settings.AUTH_TOKEN_CACHE_MAX_TTL_SECONDS)
+        if ttl > 0:
+            _token_cache.set(token_key, claims, ttl=ttl)
+    return claims
+
+async def _resolve_user(authorization: str, db) -> UserIdentity:
+    """Resolves the Authorization header to a user, creating the user on first sight."""
+    token = authorization.split(" ")[1]  # Assuming "Bearer <token>" format
+
+    clerk_user_id, email = await _get_clerk_user_id(token)
+
+    user = _user_cache.get(clerk_user_id)
+    if user is not None:
+        return user
+
+    # Find user in database using async query style
+    stmt = select(db_models.User).where(db_models.User.clerk_user_id == clerk_user_id)
+    result = await db.execute(stmt)
+    user_row = result.scalar_one_or_none()
+
+    if not user_row:
+        # Create a new user
+        user_row = db_models.User(
+            clerk_user_id=clerk_user_id,
+            username=clerk_user_id.split('_')[-1],  # Basic username from user ID
+            email=email
+        )
+        db.add(user_row)
+        await db.commit()
+        await db.refresh(user_row)
+
+    user = UserIdentity.from_model(user_row)
+    _user_cache.set(clerk_user_id, user)
+    return user
+
+async def get_current_user(authorization: str = Header(None), db = Depends(get_db)) -> UserIdentity:
     """Authenticates user using Clerk JWT from Authorization header."""
     if not authorization:
         raise HTTPException(status_code=401, detail="Authorization required")
     
     try:
-        token = authorization.split(" ")[1]  # Assuming "Bearer <token>" format
-        
-        # Log the token verification attempt
-        logger.info("Attempting to verify Clerk token")
-        
-        # Get the JWT payload
-        payload = await verify_jwt(token)
-        
-        # Extract user ID from verified JWT
-        clerk_user_id = payload.get('sub')
-        if not clerk_user_id:
-            raise HTTPException(status_code=401, detail="User ID not found in token")
-        
-        # Find user in database using async query style
-        stmt = select(db_models.User).where(db_models.User.clerk_user_id == clerk_user_id)
-        result = await db.execute(stmt)
-        user = result.scalar_one_or_none()
-        
-        if not user:
-            # Create a new user
-            email = payload.get('email')
-            user = db_models.User(
-                clerk_user_id=clerk_user_id,
-                username=clerk_user_id.split('_')[-1],  # Basic username from user ID
-                email=email
-            )
-            db.add(user)
-            await db.commit()
-            await db.refresh(user)
-        
-        return user
-            
+        return await _resolve_user(authorization, db)
     except HTTPException:
         raise
     except Exception as e:
@@ -110,49 +145,21 @@ async def get_current_user(authorization: str = Header(None), db = Depends(get_d
         raise HTTPException(status_code=500, detail="Authentication system error")
 
 @router.get("/me")
-async def get_me(current_user: db_models.User = Depends(get_current_user)):
+async def get_me(current_user: UserIdentity = Depends(get_current_user)):
     return {
         "id": current_user.id,
         "email": current_user.email,
         "username": current_user.username
     }
 
-async def get_optional_current_user(authorization: str = Header(None), db = Depends(get_db)) -> Optional[db_models.User]:
+async def get_optional_current_user(authorization: str = Header(None), db = Depends(get_db)) -> Optional[UserIdentity]:
     """Like get_current_user but returns None for unauthenticated requests instead of 401."""
     if not authorization:
         return None
     
     try:
-        token = authorization.split(" ")[1]  # Assuming "Bearer <token>" format
-        
-        # Get the JWT payload
-        payload = await verify_jwt(token)
-        
-        # Extract user ID from verified JWT
-        clerk_user_id = payload.get('sub')
-        if not clerk_user_id:
-            return None
-        
-        # Find user in database using async query style
-        stmt = select(db_models.User).where(db_models.User.clerk_user_id == clerk_user_id)
-        result = await db.execute(stmt)
-        user = result.scalar_one_or_none()
-        
-        if not user:
-            # Create a new user
-            email = payload.get('email')
-            user = db_models.User(
-                clerk_user_id=clerk_user_id,
-                username=clerk_user_id.split('_')[-1],
-                email=email
-            )
-            db.add(user)
-            await db.commit()
-            await db.refresh(user)
-        
-        return user
-            
+        return await _resolve_user(authorization, db)
     except (HTTPException, Exception) as e:
         # Log the error but return None instead of raising an exception
         logger.info(f"Optional auth failed: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -10,8 +10,12 @@ from app.core.database import get_db
 from app.models.chat_models import ChatRequest
 from app.services import neon_service, tavily_service, gemini_service, embedding_service
 from app.models import db_models
+from app.models.auth_models import UserIdentity
 from app.api import auth # Import your auth dependency/function
 from app.services import chat_service
+from app.services.history_buffer import history_buffer
+from app.services.rate_limiter import RateLimiterUnavailable, anonymous_limiter
+from app.services.session_vector_cache import session_vector_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,28 +28,39 @@ async def chat_stream_endpoint(
     chat_req: ChatRequest,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: Optional[db_models.User] = Depends(auth.get_optional_current_user)
+    current_user: Optional[UserIdentity] = Depends(auth.get_optional_current_user)
 ):
     """Chat stream endpoint that works for both authenticated and anonymous users."""
     # Check anonymous message limit if user is not authenticated
+    message_count = 0
     if not current_user:
         # Get anonymous session from cookies or create one
-        anonymous_session_id = request.cookies.get("anonymous_session_id")
-        
-        if not anonymous_session_id:
-            # First message from this anonymous user
-            anonymous_session_id = str(uuid.uuid4())
-        else:
-            # Check message count for this anonymous session
-            message_count = await chat_service.get_anonymous_message_count(db, anonymous_session_id)
-            if message_count >= 3:
-                # Limit reached, return 403 error
-                raise HTTPException(
-                    status_code=403,
-                    detail="Message limit reached for anonymous users. Please sign in to continue chatting."
-                )
-    
-    response = await chat_service.chat_stream_handler(chat_req, request, db, current_user, anonymous_session_id if not current_user else None)
+        anonymous_session_id = request.cookies.get("anonymous_session_id") or str(uuid.uuid4())
+
+        try:
+            limit = await anonymous_limiter.hit(anonymous_session_id)
+        except RateLimiterUnavailable:
+            # Letting it through would bypass the limit under the contention it exists for
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests right now, please try again shortly.",
+                headers={"Retry-After": "1"}
+            )
+        if not limit.allowed:
+            # Limit reached, return 403 error
+            raise HTTPException(
+                status_code=403,
+                detail="Message limit reached for anonymous users. Please sign in to continue chatting.",
+                headers={"Retry-After": str(int(limit.retry_after) + 1)}
+            )
+        # Messages sent before this one
+        message_count = anonymous_limiter.limit - limit.remaining - 1
+
+    response = await chat_service.chat_stream_handler(
+        chat_req, request, db, current_user,
+        anonymous_session_id if not current_user else None,
+        anonymous_message_count=message_count
+    )
     
     # If anonymous user, set cookie with session ID
     if not current_user:
@@ -60,8 +75,31 @@ async def chat_stream_endpoint(
     return response
 
 
+@router.get("/stream/{stream_id}", response_class=StreamingResponse)
+async def resume_chat_stream(
+    stream_id: str,
+    request: Request,
+    last_event_id: Optional[int] = None,
+    resume_token: Optional[str] = None
+):
+    """Resumes a dropped chat stream after the Last-Event-ID header (or last_event_id query parameter).
+
+    Takes the stream's resume token from the X-Resume-Token header (or
+    resume_token query parameter), as sent in the stream's metadata.
+    """
+    resume_token = resume_token or request.headers.get("x-resume-token")
+    if not resume_token:
+        raise HTTPException(status_code=401, detail="Missing resume token")
+    if last_event_id is None:
+        header = request.headers.get("last-event-id", "0")
+        if not header.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+        last_event_id = int(header)
+    return chat_service.resume_stream(request, stream_id, resume_token, last_event_id)
+
+
 @router.get("/sessions", response_model=list[dict]) 
-async def list_chat_sessions(db: Session = Depends(get_db), current_user: db_models.User = Depends(auth.get_current_user)):
+async def list_chat_sessions(db: Session = Depends(get_db), current_user: UserIdentity = Depends(auth.get_current_user)):
     """Lists all chat sessions for the current user."""
     # Use a join with GROUP BY to efficiently get session counts in a single query
     from sqlalchemy import func
@@ -94,7 +132,7 @@ async def list_chat_sessions(db: Session = Depends(get_db), current_user: db_mod
 async def create_chat_session(
     session_data: dict,
     db: Session = Depends(get_db),
-    current_user: db_models.User = Depends(auth.get_current_user)
+    current_user: UserIdentity = Depends(auth.get_current_user)
 ):
     """Creates a new chat session."""
     # Create a new session with optional name from request data
@@ -117,7 +155,7 @@ async def create_chat_session(
     }
 
 @router.get("/sessions/{session_id}", response_model=dict) 
-async def get_chat_session(session_id: int, db: Session = Depends(get_db), current_user: db_models.User = Depends(auth.get_current_user)):
+async def get_chat_session(session_id: int, db: Session = Depends(get_db), current_user: UserIdentity = Depends(auth.get_current_user)):
     """Gets details of a specific chat session including messages."""
     # Use selectinload to eagerly load the messages
     query = select(db_models.ChatSession).where(
@@ -155,7 +193,7 @@ async def update_chat_session(
     session_id: int,
     session_data: dict,
     db: Session = Depends(get_db),
-    current_user: db_models.User = Depends(auth.get_current_user)
+    current_user: UserIdentity = Depends(auth.get_current_user)
 ):
     """Updates chat session properties (e.g., name)."""
     query = select(db_models.ChatSession).where(
@@ -176,7 +214,7 @@ async def update_chat_session(
     return {"id": session.id, "name": session.name, "created_at": session.created_at}
 
 @router.delete("/sessions/{session_id}", response_model=dict)
-async def delete_chat_session(session_id: int, db: Session = Depends(get_db), current_user: db_models.User = Depends(auth.get_current_user)):
+async def delete_chat_session(session_id: int, db: Session = Depends(get_db), current_user: UserIdentity = Depends(auth.get_current_user)):
     """Deletes a chat session and all its messages."""
     query = select(db_models.ChatSession).where(
         db_models.ChatSession.id == session_id,
@@ -203,5 +241,7 @@ async def delete_chat_session(session_id: int, db: Session = Depends(get_db), cu
     # Delete the session itself
     await db.delete(session)
     await db.commit() # Async commit
+    session_vector_cache.invalidate(session_id)
+    history_buffer.invalidate(session_id)
 
     return {"message": "Chat session and all associated messages deleted successfully"}
\ No newline at end of file
@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.services import pdf_service
+from app.services import pdf_service, upload_spool
+from app.services.ingestion_jobs import ingestion_queue
+from app.services.session_vector_cache import session_vector_cache
 from app.models import db_models
+from app.models.auth_models import UserIdentity
 from sqlalchemy import select, delete
 from app.api import auth
 import logging
@@ -11,43 +16,86 @@ router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
-@router.post("/upload", response_model=dict)
+@router.post(
+    "/upload",
+    response_model=dict,
+    status_code=202,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"]
+                    }
+                }
+            }
+        }
+    }
+)
 async def upload_pdf_for_user(
-    file: UploadFile = File(...), 
-    db: Session = Depends(get_db), 
-    current_user: db_models.User = Depends(auth.get_current_user)
+    request: Request,
+    current_user: UserIdentity = Depends(auth.get_current_user)
 ):
-    """Uploads a PDF and associates it with the logged-in user."""
-    # File validation
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="No filename provided")
-        
-    if not file.filename.lower().endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are supported")
-    
+    """Accepts a PDF upload and queues it for background ingestion.
+
+    Returns 202 with a job ID; progress is available from /pdf/jobs/{job_id}
+    and /pdf/jobs/{job_id}/events.
+    """
+    # Refuse before reading the body if this upload could not be queued anyway
+    ingestion_queue.check_capacity(current_user.id)
+
+    # The body is streamed to disk here rather than parsed by FastAPI, so the
+    # size limit and file type are checked while the upload is still arriving
+    upload = await upload_spool.receive_pdf_upload(request)
     try:
-        # Read the file once to check size
-        content = await file.read()
-        if len(content) > 10 * 1024 * 1024:  # 10MB
-            raise HTTPException(status_code=400, detail="File too large (max 10MB)")
-        
-        # Reset file pointer
-        await file.seek(0)
-        
-        # Process the PDF
-        return await pdf_service.process_pdf_and_store(file, current_user.id, db)
-    except HTTPException:
+        job = ingestion_queue.submit(upload, current_user.id)
+    except Exception:
+        upload.remove()
         raise
-    except Exception as e:
-        logger.error(f"Error in upload_pdf_for_user: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Failed to upload PDF: {str(e)}")
+
+    return {
+        **job.to_dict(),
+        "status_url": f"/pdf/jobs/{job.id}",
+        "events_url": f"/pdf/jobs/{job.id}/events"
+    }
+
+@router.get("/jobs/{job_id}", response_model=dict)
+async def get_upload_job(
+    job_id: str,
+    current_user: UserIdentity = Depends(auth.get_current_user)
+):
+    """Returns the status of a PDF ingestion job."""
+    job = ingestion_queue.get(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}/events", response_class=StreamingResponse)
+async def stream_upload_job_events(
+    job_id: str,
+    current_user: UserIdentity = Depends(auth.get_current_user)
+):
+    """Streams the stages of a PDF ingestion job as server-sent events."""
+    job = ingestion_queue.get(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+
+    async def event_generator():
+        async for event in ingestion_queue.events(job):
+            yield f"data: {json.dumps(event)}\n\n"
+        yield f"data: {json.dumps({'status': job.status, 'result': job.result, 'error': job.error})}\n\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 # Add endpoints for listing PDFs, deleting PDFs, adding/removing from chats, etc.
 # Example:
 @router.get("/list", response_model=list[dict])
 async def list_user_pdfs(
     db: Session = Depends(get_db),
-    current_user: db_models.User = Depends(auth.get_current_user)
+    current_user: UserIdentity = Depends(auth.get_current_user)
 ):
     """List user PDFs endpoint - now calling the handler."""
     return await pdf_service.list_user_pdfs_handler(current_user, db) 
@@ -57,7 +105,7 @@ async def add_pdf_to_session(
     session_id: int,
     pdf_id: int,
     db: Session = Depends(get_db),
-    current_user: db_models.User = Depends(auth.get_current_user)
+    current_user: UserIdentity = Depends(auth.get_current_user)
 ):
     """Adds a PDF to a chat session context."""
     # Verify the session belongs to the user
@@ -94,6 +142,7 @@ async def add_pdf_to_session(
     session_pdf = db_models.ChatSessionPDF(chat_session_id=session_id, pdf_document_id=pdf_id)
     db.add(session_pdf)
     await db.commit() # Async commit
+    session_vector_cache.invalidate(session_id)
 
     return {"message": "PDF added to chat session successfully"}
 
@@ -102,7 +151,7 @@ async def remove_pdf_from_session(
     session_id: int,
     pdf_id: int,
     db: Session = Depends(get_db),
-    current_user: db_models.User = Depends(auth.get_current_user)
+    current_user: UserIdentity = Depends(auth.get_current_user)
 ):
     """Removes a PDF from a chat session context."""
     # Verify the session belongs to the user
@@ -133,6 +182,7 @@ async def remove_pdf_from_session(
         # Delete the association by object rather than using a delete statement
         await db.delete(assoc)
         await db.commit()
+        session_vector_cache.invalidate(session_id)
         
         return {"message": "PDF removed from chat session successfully"}
             
@@ -148,7 +198,7 @@ async def remove_pdf_from_session(
 async def list_session_pdfs(
     session_id: int,
     db: Session = Depends(get_db),
-    current_user: db_models.User = Depends(auth.get_current_user)
+    current_user: UserIdentity = Depends(auth.get_current_user)
 ):
     """Lists all PDFs associated with a chat session."""
     # Verify the session belongs to the user
@@ -0,0 +1,109 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded LRU cache with optional per-entry expiry and hit/miss counters.
+
+    Entries are evicted once there are more than `max_entries` of them or, when
+    `max_bytes` is set, once the summed `sizeof(value)` exceeds it. At least one
+    of the two bounds must be given.
+    Not thread-safe; it is meant to be used from the event loop only.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Callable[[Any], int] = len,
+    ):
+        if max_entries is None and max_bytes is None:
+            raise ValueError("LRUCache needs max_entries or max_bytes")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None, count: bool = True) -> Any:
+        entry = self._data.get(key)
+        if entry is not None:
+            value, expires_at, _ = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return value
+            self._remove(key)
+        if count:
+            self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (value, expires_at, size)
+        self.bytes += size
+        while self._over_capacity():
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _over_capacity(self) -> bool:
+        if self.max_entries is not None and len(self._data) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self.bytes > self.max_bytes
+
+    def _remove(self, key: Hashable):
+        _, _, size = self._data.pop(key)
+        self.bytes -= size
+
+    def touch(self, key: Hashable, ttl: Optional[float] = None) -> bool:
+        """Restarts the expiry of a live entry, e.g. to expire entries once idle."""
+        if key not in self:
+            return False
+        ttl = self.ttl if ttl is None else ttl
+        value, _, size = self._data[key]
+        self._data[key] = (value, time.monotonic() + ttl if ttl is not None else None, size)
+        return True
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._data:
+            return default
+        value = self._data[key][0]
+        self._remove(key)
+        return value
+
+    def clear(self):
+        self._data.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
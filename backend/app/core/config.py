@@ -19,6 +19,87 @@ class Settings:
 
 
     JINAAI_API_KEY = os.environ.get("JINAAI_API_KEY")
+    EMBEDDING_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_TIMEOUT_SECONDS", "30"))
+    EMBEDDING_CONNECT_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_CONNECT_TIMEOUT_SECONDS", "5"))
+    EMBEDDING_MAX_CONNECTIONS = int(os.getenv("EMBEDDING_MAX_CONNECTIONS", "20"))
+    EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+    EMBEDDING_RETRY_BASE_DELAY_SECONDS = float(os.getenv("EMBEDDING_RETRY_BASE_DELAY_SECONDS", "0.25"))
+    EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "10"))
+    EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+    EMBEDDING_BATCH_MAX_INFLIGHT = int(os.getenv("EMBEDDING_BATCH_MAX_INFLIGHT", "4"))
+    EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    PDF_MAX_UPLOAD_BYTES = int(os.getenv("PDF_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+    PDF_UPLOAD_DIR = os.getenv("PDF_UPLOAD_DIR") or None  # Defaults to the system temp dir
+    PDF_JOB_WORKERS = int(os.getenv("PDF_JOB_WORKERS", "2"))
+    PDF_JOB_QUEUE_SIZE = int(os.getenv("PDF_JOB_QUEUE_SIZE", "20"))
+    PDF_JOBS_PER_USER = int(os.getenv("PDF_JOBS_PER_USER", "2"))
+    PDF_JOB_RETENTION_SECONDS = float(os.getenv("PDF_JOB_RETENTION_SECONDS", "3600"))
+    PDF_CHUNK_TOKENS = int(os.getenv("PDF_CHUNK_TOKENS", "400"))
+    PDF_CHUNK_OVERLAP_TOKENS = int(os.getenv("PDF_CHUNK_OVERLAP_TOKENS", "50"))
+    PDF_EMBED_BATCH_SIZE = int(os.getenv("PDF_EMBED_BATCH_SIZE", "32"))
+    PDF_EMBED_CONCURRENCY = int(os.getenv("PDF_EMBED_CONCURRENCY", "4"))
+    PDF_WORKER_PROCESSES = int(os.getenv("PDF_WORKER_PROCESSES", "2"))
+    PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+    PDF_EXTRACT_TIMEOUT_SECONDS = float(os.getenv("PDF_EXTRACT_TIMEOUT_SECONDS", "120"))
+    # ANN index on document_chunks.embedding: "hnsw", "ivfflat" or "none"
+    VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw").lower()
+    HNSW_M = int(os.getenv("HNSW_M", "16"))
+    HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+    HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+    IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "100"))
+    IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+    # Retrieval filters by user and PDF after the index scan, so it needs more candidates
+    HNSW_FILTERED_EF_SEARCH = int(os.getenv("HNSW_FILTERED_EF_SEARCH", "200"))
+    IVFFLAT_FILTERED_PROBES = int(os.getenv("IVFFLAT_FILTERED_PROBES", "40"))
+    # "relaxed_order" or "strict_order", used when pgvector >= 0.8; empty to leave it off
+    VECTOR_ITERATIVE_SCAN = os.getenv("VECTOR_ITERATIVE_SCAN", "relaxed_order")
+    VECTOR_INDEX_MAINTENANCE_WORK_MEM = os.getenv("VECTOR_INDEX_MAINTENANCE_WORK_MEM", "")
+    SESSION_VECTOR_CACHE_MAX_BYTES = int(os.getenv("SESSION_VECTOR_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    # A session's vectors are dropped once it has had no turn for this long
+    SESSION_VECTOR_CACHE_TTL_SECONDS = float(os.getenv("SESSION_VECTOR_CACHE_TTL_SECONDS", "1800"))
+    # Deadlines for each context source gathered before prompting the model
+    CONTEXT_HISTORY_TIMEOUT_SECONDS = float(os.getenv("CONTEXT_HISTORY_TIMEOUT_SECONDS", "2"))
+    CONTEXT_PDF_TIMEOUT_SECONDS = float(os.getenv("CONTEXT_PDF_TIMEOUT_SECONDS", "5"))
+    CONTEXT_SEARCH_TIMEOUT_SECONDS = float(os.getenv("CONTEXT_SEARCH_TIMEOUT_SECONDS", "8"))
+    # Token budgets for each section of the chat prompt
+    PROMPT_SUMMARY_TOKENS = int(os.getenv("PROMPT_SUMMARY_TOKENS", "400"))
+    PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "1500"))
+    PROMPT_DOCUMENT_TOKENS = int(os.getenv("PROMPT_DOCUMENT_TOKENS", "2500"))
+    PROMPT_WEB_TOKENS = int(os.getenv("PROMPT_WEB_TOKENS", "1500"))
+    PROMPT_QUERY_TOKENS = int(os.getenv("PROMPT_QUERY_TOKENS", "1000"))
+    HISTORY_BUFFER_MESSAGES = int(os.getenv("HISTORY_BUFFER_MESSAGES", "10"))
+    HISTORY_BUFFER_MAX_BYTES = int(os.getenv("HISTORY_BUFFER_MAX_BYTES", str(32 * 1024 * 1024)))
+    MESSAGE_WRITER_QUEUE_SIZE = int(os.getenv("MESSAGE_WRITER_QUEUE_SIZE", "1000"))
+    MESSAGE_WRITER_BATCH_SIZE = int(os.getenv("MESSAGE_WRITER_BATCH_SIZE", "100"))
+    MESSAGE_WRITER_FLUSH_INTERVAL_MS = float(os.getenv("MESSAGE_WRITER_FLUSH_INTERVAL_MS", "200"))
+    # Append log of messages not yet written to the database; empty disables it
+    MESSAGE_LOG_PATH = os.getenv("MESSAGE_LOG_PATH", "data/chat_message_log.jsonl")
+    MESSAGE_LOG_FSYNC = os.getenv("MESSAGE_LOG_FSYNC", "false").lower() == "true"
+    # Raw messages kept next to the rolling session summary (two turns)
+    SUMMARY_RECENT_MESSAGES = int(os.getenv("SUMMARY_RECENT_MESSAGES", "4"))
+    SUMMARY_MAX_WORDS = int(os.getenv("SUMMARY_MAX_WORDS", "200"))
+    SUMMARY_TIMEOUT_SECONDS = float(os.getenv("SUMMARY_TIMEOUT_SECONDS", "30"))
+    # Answer chunks arriving within this window are sent to the client as one event; 0 disables
+    SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "15"))
+    SSE_COALESCE_MAX_CHARS = int(os.getenv("SSE_COALESCE_MAX_CHARS", "512"))
+    # Events of each chat stream kept for clients resuming with Last-Event-ID
+    STREAM_REPLAY_MAX_STREAMS = int(os.getenv("STREAM_REPLAY_MAX_STREAMS", "1000"))  # Finished ones; running streams are never evicted
+    STREAM_REPLAY_MAX_BYTES = int(os.getenv("STREAM_REPLAY_MAX_BYTES", str(1024 * 1024)))
+    STREAM_REPLAY_TTL_SECONDS = float(os.getenv("STREAM_REPLAY_TTL_SECONDS", "120"))
+    # A stream nobody follows is cancelled after this long, unless a client resumes it
+    STREAM_RESUME_GRACE_SECONDS = float(os.getenv("STREAM_RESUME_GRACE_SECONDS", "15"))
+    # Upper bound on generating one answer, context gathering included
+    STREAM_DEADLINE_SECONDS = float(os.getenv("STREAM_DEADLINE_SECONDS", "180"))
+    # Anonymous visitors get this many messages, refilled over the window
+    ANONYMOUS_MESSAGE_LIMIT = int(os.getenv("ANONYMOUS_MESSAGE_LIMIT", "3"))
+    ANONYMOUS_LIMIT_WINDOW_SECONDS = float(os.getenv("ANONYMOUS_LIMIT_WINDOW_SECONDS", str(7 * 24 * 60 * 60)))
+    # "memory" (per worker) or "sqlite" (shared by the workers on one host)
+    ANONYMOUS_LIMITER_BACKEND = os.getenv("ANONYMOUS_LIMITER_BACKEND", "memory").lower()
+    ANONYMOUS_LIMITER_MAX_KEYS = int(os.getenv("ANONYMOUS_LIMITER_MAX_KEYS", "100000"))
+    ANONYMOUS_LIMITER_SQLITE_PATH = os.getenv("ANONYMOUS_LIMITER_SQLITE_PATH", "data/rate_limits.sqlite3")
+    # How long a hit waits on another worker's write before retrying once, then refusing the request
+    ANONYMOUS_LIMITER_SQLITE_BUSY_MS = float(os.getenv("ANONYMOUS_LIMITER_SQLITE_BUSY_MS", "500"))
+
     GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
     GOOGLE_VERTEX_API_KEY = os.environ.get("GOOGLE_VERTEX_API_KEY")
 
@@ -26,8 +107,29 @@ class Settings:
     CLERK_JWT_AUDIENCE: str = os.getenv("CLERK_JWT_AUDIENCE", "http://localhost:5173") 
     CLERK_SECRET_KEY = os.environ.get("CLERK_SECRET_KEY")
     CLERK_JWKS_ENDPOINT = os.environ.get("CLERK_JWKS_ENDPOINT")
+    JWKS_CACHE_TTL_SECONDS = float(os.getenv("JWKS_CACHE_TTL_SECONDS", "3600"))
+    JWKS_MIN_REFETCH_SECONDS = float(os.getenv("JWKS_MIN_REFETCH_SECONDS", "30"))
+    JWKS_FETCH_TIMEOUT_SECONDS = float(os.getenv("JWKS_FETCH_TIMEOUT_SECONDS", "5"))
+    AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+    AUTH_TOKEN_CACHE_MAX_TTL_SECONDS = float(os.getenv("AUTH_TOKEN_CACHE_MAX_TTL_SECONDS", "3600"))
+    AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+    AUTH_USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "600"))
+    # Comma-separated Clerk user IDs allowed to use the /admin endpoints
+    ADMIN_CLERK_USER_IDS = [u.strip() for u in os.getenv("ADMIN_CLERK_USER_IDS", "").split(",") if u.strip()]
     
     TAVILY_API_KEY = os.environ.get("TAVILLY_API_KEY")
+    TAVILY_TIMEOUT_SECONDS = float(os.getenv("TAVILY_TIMEOUT_SECONDS", "10"))
+    TAVILY_CONNECT_TIMEOUT_SECONDS = float(os.getenv("TAVILY_CONNECT_TIMEOUT_SECONDS", "5"))
+    TAVILY_MAX_CONNECTIONS = int(os.getenv("TAVILY_MAX_CONNECTIONS", "10"))
+    TAVILY_CACHE_SIZE = int(os.getenv("TAVILY_CACHE_SIZE", "1000"))
+    TAVILY_CACHE_TTL_SECONDS = float(os.getenv("TAVILY_CACHE_TTL_SECONDS", "600"))
+
+    # Semantic answer cache for repeat questions without chat history
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+    ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+    # Answers built on web results go stale sooner
+    ANSWER_CACHE_SEARCH_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_SEARCH_TTL_SECONDS", "600"))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
 
 
 settings = Settings()
\ No newline at end of file
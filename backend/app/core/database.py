@@ -1,7 +1,8 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker
 from .config import settings
+from .vector_codec import register_vector_codec
 import ssl
 import logging
 
@@ -38,6 +39,11 @@ neon_engine = create_async_engine(
     pool_timeout=30            # Wait up to 30 seconds for a connection
 )
 
+@event.listens_for(neon_engine.sync_engine, "connect")
+def _register_neon_codecs(dbapi_connection, connection_record):
+    # Send and receive vectors in pgvector's binary format instead of decimal text
+    dbapi_connection.run_async(register_vector_codec)
+
 AsyncSessionLocal = sessionmaker(
     bind=engine, class_=AsyncSession, expire_on_commit=False
 )
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import httpx
+from jose import jwk
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SigningKey:
+    """A JWKS entry with its constructed key and PEM computed once."""
+
+    def __init__(self, kid: str, key_data: dict):
+        self.kid = kid
+        self.key = jwk.construct(key_data)
+        self.pem = self.key.to_pem().decode("utf-8")
+
+
+class JWKSStore:
+    """Process-wide cache of Clerk signing keys indexed by `kid`.
+
+    Keys are refreshed in the background before they go stale. A token with an
+    unknown `kid` triggers at most one refetch per `min_refetch_interval`, and
+    concurrent refetches share a single in-flight request.
+    """
+
+    def __init__(self, url: str, ttl: float, min_refetch_interval: float, timeout: float):
+        self.url = url
+        self.ttl = ttl
+        self.min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+        self._keys: dict[str, SigningKey] = {}
+        self._fetched_at = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    @property
+    def is_stale(self) -> bool:
+        return time.monotonic() - self._fetched_at > self.ttl
+
+    async def _fetch(self) -> dict[str, SigningKey]:
+        response = await self._get_client().get(self.url)
+        response.raise_for_status()
+        keys = {}
+        for key_data in response.json().get("keys", []):
+            kid = key_data.get("kid")
+            if not kid:
+                continue
+            try:
+                keys[kid] = SigningKey(kid, key_data)
+            except Exception as e:
+                logger.warning(f"Skipping unusable JWKS key {kid}: {e}")
+        return keys
+
+    async def refresh(self) -> dict[str, SigningKey]:
+        """Refetch the key set, joining an already running fetch if there is one."""
+        if self._inflight is not None:
+            return await asyncio.shield(self._inflight)
+
+        self._inflight = asyncio.get_running_loop().create_future()
+        inflight = self._inflight
+        try:
+            keys = await self._fetch()
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+            logger.info(f"Loaded {len(keys)} JWKS keys")
+            inflight.set_result(keys)
+            return keys
+        except Exception as e:
+            inflight.set_exception(e)
+            # Mark the exception as retrieved in case nobody else awaited it
+            inflight.exception()
+            raise
+        finally:
+            self._inflight = None
+
+    async def get_key(self, kid: str) -> Optional[SigningKey]:
+        """Return the signing key for `kid`, refetching once if it is unknown.
+
+        Raises only when no key set could be loaded at all; a failed refetch
+        for an unknown `kid` leaves it unknown.
+        """
+        if not self._keys or self.is_stale:
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Keep serving the previous key set if Clerk is briefly unreachable
+                if not self._keys:
+                    raise
+                logger.warning(f"JWKS refresh failed, using cached keys: {e}")
+
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+
+        if time.monotonic() - self._fetched_at >= self.min_refetch_interval or self._inflight is not None:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"JWKS refetch for unknown key {kid} failed: {e}")
+                return None
+            key = self._keys.get(kid)
+        return key
+
+    async def _refresh_loop(self):
+        # Refresh a little ahead of the TTL so requests never wait on Clerk
+        interval = max(self.ttl * 0.8, 1.0)
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Background JWKS refresh failed: {e}")
+            await asyncio.sleep(interval)
+
+    def start(self):
+        """Start the background refresh task."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+jwks_store = JWKSStore(
+    url=settings.CLERK_JWKS_ENDPOINT,
+    ttl=settings.JWKS_CACHE_TTL_SECONDS,
+    min_refetch_interval=settings.JWKS_MIN_REFETCH_SECONDS,
+    timeout=settings.JWKS_FETCH_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,10 @@
+import re
+
+# Words, numbers and individual punctuation marks. This tracks subword
+# tokenizer counts closely enough for budgeting without loading a model.
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count of `text`."""
+    return sum(1 for _ in TOKEN_PATTERN.finditer(text))
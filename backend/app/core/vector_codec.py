@@ -0,0 +1,30 @@
+import logging
+
+from pgvector import Vector
+
+logger = logging.getLogger(__name__)
+
+
+def _encode_vector(value) -> bytes:
+    # ORM writes arrive already rendered as '[...]' text by pgvector's SQLAlchemy
+    # type; query vectors are plain lists. Both go over the wire as binary.
+    if isinstance(value, str):
+        value = Vector.from_text(value)
+    elif not isinstance(value, Vector):
+        value = Vector(value)
+    return value.to_binary()
+
+
+async def register_vector_codec(conn):
+    """Registers pgvector's binary format for the `vector` type on an asyncpg connection."""
+    try:
+        await conn.set_type_codec(
+            "vector",
+            schema="public",
+            encoder=_encode_vector,
+            decoder=Vector.from_binary,
+            format="binary"
+        )
+    except ValueError as e:
+        # The extension may not be installed yet on a fresh database
+        logger.warning(f"pgvector codec not registered: {e}")
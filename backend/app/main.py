@@ -3,8 +3,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from sqlalchemy import text
-from app.api import chat, pdfs, auth  # Import API routers
+from app.api import chat, pdfs, auth, admin  # Import API routers
 from app.core.database import engine, Base, neon_engine, NeonBase 
+from app.core.jwks import jwks_store
+from app.services import embedding_service, neon_service, pdf_extraction, summary_service, tavily_service, vector_index
+from app.services.ingestion_jobs import ingestion_queue
+from app.services.message_writer import message_writer, migrate_chat_messages
+from app.services.rate_limiter import anonymous_limiter
+from app.services.stream_registry import stream_registry
 import logging 
 
 logging.basicConfig(level=logging.INFO) 
@@ -15,22 +21,45 @@ async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
 
         await conn.run_sync(Base.metadata.create_all)
+        await summary_service.migrate_chat_sessions(conn)
+        await migrate_chat_messages(conn)
     logger.info("Supabase tables verified/created")
 
+    # Writes chat messages behind the stream, replaying any left from a crash
+    await message_writer.start()
+
     # Create NeonDB tables (vector‑specific models) if they don't exist
     async with neon_engine.begin() as neon_conn:
         try:
             await neon_conn.run_sync(NeonBase.metadata.create_all)
+            await neon_service.migrate_document_chunks(neon_conn)
             logger.info("Neon tables verified/created")
             
         except Exception as e:
             logger.error(f"Error setting up Neon database: {str(e)}")
     logger.info("Neon tables verified/created")
+
+    # Building the ANN index can take minutes on a large table, so don't block startup
+    vector_index.start_index_build()
+
+    # Warm the Clerk signing keys and keep them fresh in the background
+    jwks_store.start()
+    ingestion_queue.start()
     
     yield  # This is where the app runs
     
     # Shutdown: Add any cleanup code here
     logger.info("Shutting down application")
+    await ingestion_queue.stop()
+    await vector_index.stop_index_build()
+    await stream_registry.shutdown(timeout=5)
+    await summary_service.drain(timeout=10)
+    await message_writer.stop(timeout=10)
+    await jwks_store.close()
+    await embedding_service.close_client()
+    await tavily_service.close_client()
+    anonymous_limiter.close()
+    pdf_extraction.shutdown_executor()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -45,6 +74,7 @@ app.add_middleware(
 app.include_router(chat.router, prefix="/chat", tags=["Chat"])
 app.include_router(pdfs.router, prefix="/pdf", tags=["Pdf"])
 app.include_router(auth.router, prefix="/auth", tags=["Auth"]) 
+app.include_router(admin.router, prefix="/admin", tags=["Admin"])
 
 @app.get("/health")
 async def health_check():
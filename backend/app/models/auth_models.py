@@ -0,0 +1,17 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from app.models import db_models
+
+
+@dataclass(frozen=True)
+class UserIdentity:
+    """Lightweight view of a `users` row, safe to share across requests."""
+    id: int
+    clerk_user_id: str
+    username: Optional[str]
+    email: Optional[str]
+
+    @classmethod
+    def from_model(cls, user: db_models.User) -> "UserIdentity":
+        return cls(id=user.id, clerk_user_id=user.clerk_user_id, username=user.username, email=user.email)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Float, Integer, String, DateTime, ForeignKey, Boolean, Text, TypeDecorator
+from sqlalchemy import Column, Float, Integer, String, DateTime, ForeignKey, Boolean, Text, TypeDecorator, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects import postgresql
@@ -25,6 +25,8 @@ class ChatSession(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     name = Column(String, default="New Chat") # Optional chat name
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    summary = Column(Text, nullable=True) # Rolling summary of turns older than recent_messages
+    recent_messages = Column(postgresql.JSONB(astext_type=Text), nullable=True) # Last raw messages, oldest first
 
     user = relationship("User", back_populates="chat_sessions")
     messages = relationship("ChatMessage", back_populates="chat_session", lazy="selectin")
@@ -41,6 +43,8 @@ class ChatMessage(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     is_user_message = Column(Boolean, default=True) # Flag if message is from user or bot
     search_data = Column(postgresql.JSONB(astext_type=Text), nullable=True)
+    # Set by the message writer, so replaying a batch that was already committed inserts nothing
+    client_id = Column(postgresql.UUID(as_uuid=True), unique=True, index=True, nullable=True)
 
     chat_session = relationship("ChatSession", back_populates="messages", lazy="selectin")
     user = relationship("User") # Optional user relationship
@@ -83,9 +87,24 @@ class ChatSessionPDF(Base):
 
 class DocumentChunk(NeonBase):
     __tablename__ = "document_chunks"
+    __table_args__ = (
+        sa.Index("ix_document_chunks_user_id_pdf_document_id", "user_id", "pdf_document_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     chunk_text = Column(String)
     embedding = Column(Vector(768))
     document_metadata = Column(postgresql.JSONB(astext_type=Text))
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    # Copied out of document_metadata so searches can filter in SQL
+    user_id = Column(Integer)
+    pdf_document_id = Column(Integer)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class EmbeddingCacheEntry(NeonBase):
+    """Persistent embedding cache keyed by model and normalized text hash."""
+    __tablename__ = "embedding_cache"
+
+    model = Column(String, primary_key=True)
+    text_hash = Column(LargeBinary, primary_key=True) # SHA-256 of the normalized text
+    embedding = Column(LargeBinary) # float32 vector bytes
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,99 @@
+import itertools
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    embedding: np.ndarray
+    bucket: tuple
+    query: str
+    answer: str
+    search: str
+
+
+def _unit(vector: list) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+class AnswerCache:
+    """Generated answers keyed by query embedding.
+
+    A question is answered from the cache when a stored one with the same
+    search mode and PDF set is at least `threshold` cosine-similar to it.
+    Entries expire after `ttl` (`search_ttl` for web-search answers) and the
+    least recently used are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, search_ttl: float, threshold: float):
+        self.ttl = ttl
+        self.search_ttl = search_ttl
+        self.threshold = threshold
+        self._entries = LRUCache(max_entries=max_entries, ttl=ttl)
+        # Entry ids per (search mode, PDF set); ids the LRU has dropped are pruned lazily
+        self._buckets: dict[tuple, list[int]] = {}
+        self._ids = itertools.count()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, query_embedding: list, search_mode: bool, pdf_fingerprint: tuple = ()) -> Optional[CachedAnswer]:
+        bucket = (search_mode, pdf_fingerprint)
+        ids = self._buckets.get(bucket, [])
+        live = [(entry_id, entry) for entry_id in ids
+                if (entry := self._entries.get(entry_id, count=False)) is not None]
+        if len(live) != len(ids):
+            if live:
+                self._buckets[bucket] = [entry_id for entry_id, _ in live]
+            else:
+                self._buckets.pop(bucket, None)
+
+        if live:
+            scores = np.stack([entry.embedding for _, entry in live]) @ _unit(query_embedding)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                entry_id, entry = live[best]
+                self._entries.get(entry_id)  # Refresh its LRU position
+                self.hits += 1
+                logger.info(f"Answer cache hit (similarity {scores[best]:.3f}) for: {entry.query[:80]}")
+                return entry
+        self.misses += 1
+        return None
+
+    def store(self, query: str, query_embedding: list, search_mode: bool, answer: str, search: str,
+              pdf_fingerprint: tuple = ()):
+        bucket = (search_mode, pdf_fingerprint)
+        entry = CachedAnswer(embedding=_unit(query_embedding), bucket=bucket, query=query, answer=answer, search=search)
+        entry_id = next(self._ids)
+        self._entries.set(entry_id, entry, ttl=self.search_ttl if search_mode else self.ttl)
+        ids = self._buckets.setdefault(bucket, [])
+        ids.append(entry_id)
+        if len(ids) > self._entries.max_entries:
+            self._buckets[bucket] = [i for i in ids if i in self._entries]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            **self._entries.stats(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "threshold": self.threshold,
+        }
+
+
+answer_cache = AnswerCache(
+    max_entries=settings.ANSWER_CACHE_SIZE,
+    ttl=settings.ANSWER_CACHE_TTL_SECONDS,
+    search_ttl=settings.ANSWER_CACHE_SEARCH_TTL_SECONDS,
+    threshold=settings.ANSWER_CACHE_SIMILARITY,
+)
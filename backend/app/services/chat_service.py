@@ -1,28 +1,41 @@
 from fastapi import HTTPException, Request
 from fastapi.responses import StreamingResponse
 from sqlalchemy import select
+from sqlalchemy.orm import lazyload
 from sqlalchemy.orm import Session
+import asyncio
 import time
 import json
-from app.services import neon_service, tavily_service, gemini_service, embedding_service
+from datetime import datetime, timezone
+from app.services import tavily_service, gemini_service, embedding_service, summary_service
+from app.services.answer_cache import answer_cache
+from app.services.history_buffer import history_buffer
+from app.services.message_writer import message_row, message_writer
+from app.services.sse import coalesce
+from app.services.stream_registry import ReplayUnavailable, stream_registry
+from app.services.prompt_builder import prompt_builder
+from app.services.session_vector_cache import session_vector_cache, pdf_fingerprint
+from app.core.config import settings
 from app.models.chat_models import ChatRequest
 from app.models import db_models
+from app.models.auth_models import UserIdentity
 import logging
-from typing import Optional
+from typing import Optional, Union
 
 logger = logging.getLogger(__name__)
-_anonymous_message_counts = {}
 
 async def chat_stream_handler(
     chat_req: ChatRequest, 
     request: Request, 
     db: Session, 
-    current_user: Optional[db_models.User],
-    anonymous_session_id: Optional[str] = None
+    current_user: Optional[UserIdentity],
+    anonymous_session_id: Optional[str] = None,
+    anonymous_message_count: int = 0
 ) -> StreamingResponse:
     """Handles the chat stream logic for both authenticated and anonymous users."""
     query = chat_req.query
     start_time = time.time()
+    received_at = datetime.now(timezone.utc)
     session_id = chat_req.session_id
     
     # Create or get chat session
@@ -33,7 +46,8 @@ async def chat_stream_handler(
                 select(db_models.ChatSession).filter(
                     db_models.ChatSession.id == session_id, 
                     db_models.ChatSession.user_id == current_user.id
-                )
+                # History comes from the session's summary columns, not its message rows
+                ).options(lazyload(db_models.ChatSession.messages))
             )
             chat_session = session_result.scalar_one_or_none()
             if not chat_session:
@@ -63,161 +77,251 @@ async def chat_stream_handler(
         # For anonymous users, no need to store in DB, just track in memory or Redis
         # You could use a lightweight Redis or in-memory store to track anonymous sessions
         
-    # Continue with the existing code...
-    chat_history_str = await get_chat_history_str(db, chat_session_id) if current_user else ""
-    
-    # PDF context processing
-    pdf_context = ""
-    if current_user and context_pdfs:
-        # Only authenticated users can access PDFs
-        try:
-            query_embedding = embedding_service.get_embedding(query)
-            
-            # Pass user_id and pdf_ids to ensure proper filtering
-            retrieved_chunks = await neon_service.search_neon_chunks(
-                query_embedding=query_embedding,
-                user_id=current_user.id,
-                pdf_ids=context_pdfs,
-                top_n=5
-            )
-            
-            if retrieved_chunks:
-                pdf_context = "Here are the most relevant sections from your documents:\n\n" + \
-                            "\n\n".join(retrieved_chunks)
-            else:
-                pdf_context = "No relevant information found in the specified documents."
-                
-        except Exception as e:
-            logger.error(f"Error retrieving PDF context: {str(e)}", exc_info=True)
-            pdf_context = "Error retrieving PDF context from your documents."
-    
-    # Search context if requested
-    tavily_context = ""
-    if chat_req.isSearchMode:
-        tavily_info = tavily_service.fetch_tavily_data(query)
-        tavily_context = json.dumps(tavily_info) if isinstance(tavily_info, dict) else str(tavily_info)
-        if not tavily_context:
-            tavily_context = "No additional web info found."
-
-    prompt = f"""
-    You are a helpful assistant. Answer the user's question based on the provided information.
-
-    {chat_req.isSearchMode and f'''
-    **Web Search Results:**
-    {tavily_context}
-    ''' or ''}
-
-    **Document Context:**
-    {pdf_context}
-
-    **Chat History:**
-    {chat_history_str}
-
-    **User Question:** {query}
-
-    Instructions:
-    1. Maintain the conversation flow by referring to previous exchanges when relevant.
-    3. When including code snippets:
-    - Use triple backticks with the language name for syntax highlighting (```python, ```javascript, etc.)
-    - Ensure code is properly indented and follows best practices
-    - Add brief comments explaining key parts of the code
-    - For React code, use ```jsx for proper syntax highlighting
-    4. Provide clear explanations and examples to help the user understand the topic.
-    5. Provide Code examples when possible to help the user implement the solution.
-    6. If you need more information, ask the user for clarification.
-    7. If you need to search the web for more information, let the user know."""
-
-    print(prompt)
-    async def sse_generator():
-        
-        current_count = 0
-        if not current_user and anonymous_session_id:
-            current_count = await get_anonymous_message_count(anonymous_session_id)
+    fingerprint = pdf_fingerprint(context_pdfs)
+    bypass_answer_cache = "no-cache" in request.headers.get("cache-control", "").lower()
 
-        # Send metadata with session ID first
+    async def sse_generator():
+        # Open the stream right away; context and sources follow as they arrive
         metadata = {
-            "search": tavily_context, 
-            "duration": time.time() - start_time, 
+            "stream_id": stream.id,
+            "resume_token": stream.resume_token,
+            "search": None,
+            "duration": time.time() - start_time,
             "chat_session_id": chat_session_id if current_user else None,
             "anonymous": current_user is None,
-            "message_count": current_count if not current_user else None
+            "message_count": anonymous_message_count if not current_user else None,
         }
-        yield f"data: {json.dumps({'type': 'metadata', 'data': metadata})}\n\n"
+        yield {'type': 'metadata', 'data': metadata}
+        yield {'type': 'status', 'status': 'retrieving'}
 
-        full_answer = ""
+        # History, PDF retrieval and web search are independent, so gather them
+        # concurrently; each degrades to a fallback if it misses its deadline
+        context_start = time.time()
+        failed_sources = []
 
-        # Stream the model response
-        async for chunk in gemini_service.generate_response_with_gemini_streaming(prompt):
-            if await request.is_disconnected():
-                logger.info("Client disconnected, stopping stream.")
-                break
-            
-            # Parse the chunk and extract text
-            try:
-                chunk_data = json.loads(chunk.removeprefix("data: ").removesuffix("\n\n"))
-                chunk_text = chunk_data.get('text', '')
-                full_answer += chunk_text
-                
-                # Send chunk as SSE
-                yield f"data: {json.dumps({'type': 'content', 'text': chunk_text})}\n\n"
-            except Exception as e:
-                logger.error(f"Error processing chunk: {e}")
-                continue
+        # Anonymous turns and new sessions have no history, so the answer cache
+        # will need the query embedding as well
+        query_embedding = None
+        if context_pdfs or not current_user or not session_id:
+            query_embedding = _start_embedding(query)
 
-        # Save messages for authenticated users only
-        if current_user:
-            # Save the messages to the database (existing code)
-            user_message = db_models.ChatMessage(
-                session_id=chat_session_id, 
-                user_id=current_user.id, 
-                content=query, 
-                is_user_message=True
+        history_task = _child_task(_with_deadline(
+            "history",
+            summary_service.get_prompt_history(chat_session) if current_user and session_id else _empty_context(("", [])),
+            settings.CONTEXT_HISTORY_TIMEOUT_SECONDS,
+            fallback=("", []),
+            failures=failed_sources
+        ))
+        pdf_task = _child_task(_with_deadline(
+            "pdf",
+            # Only authenticated users can access PDFs
+            _get_pdf_context(query_embedding, current_user.id, chat_session_id, context_pdfs)
+            if current_user and context_pdfs else _empty_context([]),
+            settings.CONTEXT_PDF_TIMEOUT_SECONDS,
+            fallback=None,
+            failures=failed_sources
+        ))
+        search_task = _child_task(_with_deadline(
+            "search",
+            _get_search_context(query) if chat_req.isSearchMode else _empty_context(),
+            settings.CONTEXT_SEARCH_TIMEOUT_SECONDS,
+            fallback="",
+            failures=failed_sources
+        ))
+
+        # Sources are sent as soon as each task finishes; the answer cache is
+        # checked once the history is known
+        pending = {history_task, pdf_task, search_task}
+        cached_answer = None
+        answer_embedding = None
+        cacheable = False
+        while pending and cached_answer is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if pdf_task in done and pdf_task.result():
+                yield {'type': 'sources', 'source': 'documents', 'data': _document_sources(pdf_task.result())}
+            if search_task in done and search_task.result():
+                yield {'type': 'sources', 'source': 'web', 'data': search_task.result()}
+            if history_task in done:
+                # Answers only depend on the question and its sources when there is no
+                # history, so only those turns are served from or stored in the answer cache
+                chat_summary, chat_history = history_task.result()
+                cacheable = "history" not in failed_sources and not chat_summary and not chat_history
+                if cacheable:
+                    answer_embedding = await _with_deadline(
+                        "embedding",
+                        asyncio.shield(query_embedding if query_embedding is not None else _start_embedding(query)),
+                        settings.CONTEXT_PDF_TIMEOUT_SECONDS,
+                        fallback=None
+                    )
+                    if answer_embedding is not None and not bypass_answer_cache:
+                        cached_answer = answer_cache.lookup(answer_embedding, chat_req.isSearchMode, fingerprint)
+        logger.info(f"Context gathered in {time.time() - context_start:.2f}s")
+
+        if cached_answer:
+            pdf_task.cancel()
+            search_task.cancel()
+            tavily_context = cached_answer.search
+            if chat_req.isSearchMode and tavily_context:
+                yield {'type': 'sources', 'source': 'web', 'data': _parse_search(tavily_context)}
+            answer_stream = _replay_answer(cached_answer.answer)
+        else:
+            pdf_chunks, tavily_info = pdf_task.result(), search_task.result()
+
+            tavily_context = ""
+            if chat_req.isSearchMode:
+                tavily_context = json.dumps(tavily_info) if tavily_info else "No additional web info found."
+
+            if pdf_chunks is None:
+                document_note = "Error retrieving PDF context from your documents."
+            elif context_pdfs:
+                document_note = "No relevant information found in the specified documents."
+            else:
+                document_note = ""
+
+            prompt, prompt_report = prompt_builder.build(
+                query,
+                history=chat_history,
+                summary=chat_summary,
+                documents=pdf_chunks or [],
+                web_results=(tavily_info or {}).get("results", []) if chat_req.isSearchMode else None,
+                document_note=document_note
             )
+            logger.info(f"Prompt token breakdown for session {chat_session_id}: {prompt_report.to_dict()}")
+            answer_stream = gemini_service.generate_response_with_gemini_streaming(prompt)
+
+        yield {
+            'type': 'status',
+            'status': 'generating',
+            'cached': cached_answer is not None,
+            'duration': time.time() - start_time
+        }
+
+        # Joined once at the end rather than concatenated per chunk
+        answer_parts = []
 
+        # Stream the model response, or replay a cached one in the same events
+        answer_stream = coalesce(answer_stream, settings.SSE_COALESCE_MAX_CHARS, settings.SSE_COALESCE_MS / 1000)
+        # Runs on in the background if the client drops, so it can resume the stream
+        async for chunk_text in answer_stream:
+            answer_parts.append(chunk_text)
+            yield {'type': 'content', 'text': chunk_text}
+        full_answer = "".join(answer_parts)
+
+        if (cacheable and cached_answer is None and full_answer
+                and answer_embedding is not None and not failed_sources):
+            answer_cache.store(query, answer_embedding, chat_req.isSearchMode, full_answer, tavily_context, fingerprint)
+
+        # Save messages for authenticated users only
+        if current_user:
+            # Written behind by the message writer, so the stream doesn't wait on the database
             search_data_str = tavily_context if chat_req.isSearchMode else None
+            await message_writer.submit([
+                message_row(chat_session_id, current_user.id, query, True, created_at=received_at),
+                message_row(chat_session_id, None, full_answer, False, search_data=search_data_str),
+            ])
 
-            bot_message = db_models.ChatMessage(
-                session_id=chat_session_id, 
-                user_id=None, 
-                content=full_answer, 
-                is_user_message=False,
-                search_data=search_data_str
-            )
-            db.add_all([user_message, bot_message])
-            await db.commit()
+            try:
+                await summary_service.record_exchange(chat_session_id, query, full_answer)
+            except Exception as e:
+                logger.error(f"Error updating history of session {chat_session_id}: {str(e)}", exc_info=True)
+            finally:
+                # Only sessions without recent_messages read the buffer; after this exchange
+                # it is either stale or, once recent_messages is set, never read again
+                history_buffer.invalidate(chat_session_id)
         
         # Send completion notification
-        yield f"data: {json.dumps({'type': 'end'})}\n\n"
+        yield {'type': 'end'}
 
-    return StreamingResponse(sse_generator(), media_type="text/event-stream")
+    stream = stream_registry.create()
+    stream_registry.start(stream, sse_generator())
+    return StreamingResponse(
+        stream.follow(receive=request.receive), media_type="text/event-stream", headers={"X-Stream-Id": stream.id}
+    )
 
-async def get_chat_history_str(db: Session, chat_session_id: int) -> str:
-    """Retrieves and formats chat history as a string."""
+def resume_stream(request: Request, stream_id: str, resume_token: str, last_event_id: int) -> StreamingResponse:
+    """Continues a stream after `last_event_id` from its replay buffer, without generating again.
 
-    from sqlalchemy import select as sqlalchemy_select
-    chat_history = []
-    if chat_session_id:
-        query = sqlalchemy_select(db_models.ChatMessage).where(
-            db_models.ChatMessage.session_id == chat_session_id
-        ).order_by(db_models.ChatMessage.created_at.desc()).limit(10)
-        
-        # Execute the query
-        messages_result = await db.execute(query)
-        messages = messages_result.scalars().all()
-        messages = list(reversed(messages))
-        
-        for msg in messages:
-            role = "user" if msg.is_user_message else "assistant"
-            chat_history.append(f"{role}: {msg.content}")
-    
-    return "\n".join(chat_history) if chat_history else "No previous messages in this chat."
+    The stream's resume token stands in for the caller's identity, as
+    anonymous clients can't send their cookie on the cross-origin request.
+    """
+    stream = stream_registry.get(stream_id, resume_token)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Stream not found or expired")
+    try:
+        frames = stream.follow(last_event_id, receive=request.receive)
+    except ReplayUnavailable:
+        raise HTTPException(status_code=410, detail="Stream events are no longer available")
+    logger.info(f"Resuming stream {stream_id} after event {last_event_id}")
+    return StreamingResponse(frames, media_type="text/event-stream", headers={"X-Stream-Id": stream_id})
 
+async def _empty_context(value=""):
+    return value
 
-async def get_anonymous_message_count(anonymous_session_id: str) -> int:
-    """Track and return the number of messages sent by an anonymous user."""
-    global _anonymous_message_counts
-    
-    current_count = _anonymous_message_counts.get(anonymous_session_id, 0)
-    _anonymous_message_counts[anonymous_session_id] = current_count + 1
-    
-    return current_count
\ No newline at end of file
+async def _with_deadline(source: str, coro, timeout: float, fallback, failures: Optional[list] = None):
+    """Awaits one context source, returning `fallback` if it fails or runs past `timeout`.
+
+    The names of sources that fell back are appended to `failures`.
+    """
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Timed out gathering {source} context after {timeout}s")
+    except Exception as e:
+        logger.error(f"Error gathering {source} context: {str(e)}", exc_info=True)
+    if failures is not None:
+        failures.append(source)
+    return fallback
+
+def _child_task(coro) -> asyncio.Task:
+    """Starts `coro` in a task that is cancelled once the calling task ends.
+
+    The stream's context lookups are started this way, so cancelling the
+    stream (disconnect, deadline or shutdown) also aborts their HTTP calls
+    and releases their connections.
+    """
+    task = asyncio.ensure_future(coro)
+    parent = asyncio.current_task()
+    if parent is not None:
+        parent.add_done_callback(lambda _: task.cancel())
+    return task
+
+def _start_embedding(query: str) -> asyncio.Future:
+    """Starts embedding the query so several consumers can await the same result."""
+    task = _child_task(embedding_service.get_embedding(query))
+    # Consumers may all have given up on it by the time it fails
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+    return task
+
+async def _replay_answer(answer: str, chunk_size: int = 200):
+    """Yields a cached answer in chunks, like the Gemini stream."""
+    for i in range(0, len(answer), chunk_size):
+        yield answer[i:i + chunk_size]
+
+async def _get_pdf_context(embedding: asyncio.Future, user_id: int, chat_session_id: int, context_pdfs: list) -> list[str]:
+    # Shielded: the answer cache may still need the embedding if this times out
+    query_embedding = await asyncio.shield(embedding)
+
+    # Ranked in memory once the session's PDF vectors are loaded;
+    # user_id and pdf_ids still scope what gets loaded
+    retrieved_chunks = await session_vector_cache.search(
+        chat_session_id=chat_session_id,
+        user_id=user_id,
+        pdf_ids=context_pdfs,
+        query_embedding=query_embedding,
+        top_n=5
+    )
+
+    return retrieved_chunks
+
+def _document_sources(pdf_chunks: list[str]) -> list[str]:
+    """The "[Source: ...]" labels of retrieved chunks, for the client to list."""
+    return [chunk.split("\n", 1)[0].removeprefix("[Source: ").removesuffix("]") for chunk in pdf_chunks]
+
+def _parse_search(tavily_context: str) -> Union[dict, str]:
+    try:
+        return json.loads(tavily_context)
+    except ValueError:
+        return tavily_context
+
+async def _get_search_context(query: str) -> Union[dict, str]:
+    return await tavily_service.fetch_tavily_data(query)
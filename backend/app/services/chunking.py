@@ -0,0 +1,70 @@
+from dataclasses import dataclass
+from itertools import groupby
+from operator import itemgetter
+
+from app.core.tokens import TOKEN_PATTERN
+
+
+@dataclass
+class Chunk:
+    index: int
+    text: str
+    page_start: int
+    page_end: int
+    token_count: int
+
+
+class PageChunker:
+    """Splits page text into overlapping, token-bounded chunks.
+
+    Pages are fed in order with `add_page` and completed chunks are returned as
+    soon as they fill up, so only the pages still inside the current window are
+    held in memory. Each chunk records the first and last page it covers.
+    """
+
+    def __init__(self, max_tokens: int, overlap_tokens: int):
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self._pages: dict[int, str] = {}
+        self._window: list[tuple[int, int, int]] = []  # (page_number, start, end)
+        self._fresh = 0  # tokens not yet covered by an emitted chunk
+        self._count = 0
+
+    def add_page(self, page_number: int, text: str) -> list[Chunk]:
+        chunks = []
+        self._pages[page_number] = text.replace('\x00', '')
+        for match in TOKEN_PATTERN.finditer(self._pages[page_number]):
+            self._window.append((page_number, match.start(), match.end()))
+            self._fresh += 1
+            if len(self._window) == self.max_tokens:
+                chunks.append(self._emit())
+        return chunks
+
+    def finish(self) -> list[Chunk]:
+        """Returns the final partial chunk, if any text is left over."""
+        return [self._emit()] if self._fresh else []
+
+    def _emit(self) -> Chunk:
+        parts = []
+        for page_number, tokens in groupby(self._window, key=itemgetter(0)):
+            tokens = list(tokens)
+            parts.append(self._pages[page_number][tokens[0][1]:tokens[-1][2]])
+
+        chunk = Chunk(
+            index=self._count,
+            text="\n".join(parts),
+            page_start=self._window[0][0],
+            page_end=self._window[-1][0],
+            token_count=len(self._window),
+        )
+        self._count += 1
+
+        self._window = self._window[len(self._window) - self.overlap_tokens:] if self.overlap_tokens else []
+        self._fresh = 0
+        # Forget pages that no longer contribute to the window
+        live_pages = {token[0] for token in self._window}
+        for page_number in [p for p in self._pages if p not in live_pages]:
+            del self._pages[page_number]
+        return chunk
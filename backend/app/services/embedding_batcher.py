@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text embedding requests into batched upstream calls.
+
+    Requests are collected for up to `window` seconds or until `max_batch_size`
+    texts are waiting, then sent as one call to `embed_many`. At most
+    `max_inflight` upstream calls run at once; further batches queue behind them.
+    """
+
+    def __init__(
+        self,
+        embed_many: Callable[[list[str]], Awaitable[list[list]]],
+        window: float,
+        max_batch_size: int,
+        max_inflight: int,
+    ):
+        self.embed_many = embed_many
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._semaphore = asyncio.Semaphore(max_inflight)
+        self._pending: list[tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+
+        # Metrics
+        self.batches = 0
+        self.requests = 0
+        self.upstream_inputs = 0
+        self.total_queue_delay = 0.0
+        self.max_queue_delay = 0.0
+        self.inflight = 0
+
+    async def embed(self, text: str) -> list:
+        """Returns the embedding for `text`, sharing an upstream call with concurrent callers."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.monotonic()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: list[tuple[str, asyncio.Future, float]]):
+        async with self._semaphore:
+            # Callers that gave up while queued don't need a vector
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                return
+
+            now = time.monotonic()
+            for _, _, enqueued_at in batch:
+                delay = now - enqueued_at
+                self.total_queue_delay += delay
+                self.max_queue_delay = max(self.max_queue_delay, delay)
+
+            # Identical texts in the same window are embedded once
+            unique_texts = list(dict.fromkeys(text for text, _, _ in batch))
+            self.batches += 1
+            self.requests += len(batch)
+            self.upstream_inputs += len(unique_texts)
+
+            self.inflight += 1
+            try:
+                vectors = await self.embed_many(unique_texts)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            finally:
+                self.inflight -= 1
+
+            by_text = dict(zip(unique_texts, vectors))
+            for text, future, _ in batch:
+                if not future.done():
+                    future.set_result(by_text[text])
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "upstream_inputs": self.upstream_inputs,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "avg_batch_fill": self.upstream_inputs / (self.batches * self.max_batch_size) if self.batches else 0.0,
+            "avg_queue_delay_ms": 1000 * self.total_queue_delay / self.requests if self.requests else 0.0,
+            "max_queue_delay_ms": 1000 * self.max_queue_delay,
+            "inflight": self.inflight,
+            "pending": len(self._pending),
+        }
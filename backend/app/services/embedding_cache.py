@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import logging
+import re
+import unicodedata
+from array import array
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.database import NeonAsyncSessionLocal
+from app.models.db_models import EmbeddingCacheEntry
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for both hashing and embedding."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def pack_vector(vector) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(data: bytes) -> list:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: an in-process LRU in front of a Neon table.
+
+    Keys are (model, SHA-256 of normalized text); vectors are kept as float32
+    bytes in both tiers. Writes to the persistent tier happen in the background.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._memory = LRUCache(max_bytes=max_bytes)
+        self._tasks: set[asyncio.Task] = set()
+        self.persistent_hits = 0
+        self.persistent_misses = 0
+
+    def get(self, model: str, digest: bytes):
+        data = self._memory.get((model, digest))
+        return unpack_vector(data) if data is not None else None
+
+    async def get_persistent(self, model: str, digests: list[bytes]) -> dict[bytes, list]:
+        """Looks up several hashes in the Neon tier and promotes hits to memory."""
+        if not digests:
+            return {}
+        try:
+            async with NeonAsyncSessionLocal() as neon_db:
+                result = await neon_db.execute(
+                    select(EmbeddingCacheEntry.text_hash, EmbeddingCacheEntry.embedding).where(
+                        EmbeddingCacheEntry.model == model,
+                        EmbeddingCacheEntry.text_hash.in_(digests)
+                    )
+                )
+                rows = result.all()
+        except Exception as e:
+            logger.warning(f"Embedding cache lookup failed: {e}")
+            return {}
+
+        found = {}
+        for digest, data in rows:
+            digest, data = bytes(digest), bytes(data)
+            self._memory.set((model, digest), data)
+            found[digest] = unpack_vector(data)
+        self.persistent_hits += len(found)
+        self.persistent_misses += len(digests) - len(found)
+        return found
+
+    def put_many(self, model: str, items: dict[bytes, list]):
+        """Stores vectors in memory now and in the Neon tier in the background."""
+        if not items:
+            return
+        packed = {digest: pack_vector(vector) for digest, vector in items.items()}
+        for digest, data in packed.items():
+            self._memory.set((model, digest), data)
+        task = asyncio.get_running_loop().create_task(self._persist(model, packed))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _persist(self, model: str, packed: dict[bytes, bytes]):
+        try:
+            async with NeonAsyncSessionLocal() as neon_db:
+                await neon_db.execute(
+                    insert(EmbeddingCacheEntry)
+                    .values([
+                        {"model": model, "text_hash": digest, "embedding": data}
+                        for digest, data in packed.items()
+                    ])
+                    .on_conflict_do_nothing(index_elements=["model", "text_hash"])
+                )
+                await neon_db.commit()
+        except Exception as e:
+            logger.warning(f"Failed to persist {len(packed)} cached embeddings: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "memory": self._memory.stats(),
+            "persistent_hits": self.persistent_hits,
+            "persistent_misses": self.persistent_misses,
+        }
+
+
+embedding_cache = EmbeddingCache(max_bytes=settings.EMBEDDING_CACHE_MAX_BYTES)
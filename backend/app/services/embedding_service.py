@@ -1,28 +1,122 @@
-import requests
+import asyncio
+import random
+from typing import Optional
+import httpx
 from fastapi import HTTPException
 from app.core.config import settings
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import embedding_cache, normalize_text, text_hash
 import logging
 
 logger = logging.getLogger(__name__)
 
-def get_embedding(text: str) -> list:
-    """Generates embeddings using Jina AI."""
-    url = "https://api.jina.ai/v1/embeddings"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {settings.JINAAI_API_KEY}"
-    }
+JINA_EMBEDDINGS_URL = "https://api.jina.ai/v1/embeddings"
+EMBEDDING_MODEL = "jina-embeddings-v2-base-en"
+
+# Statuses worth retrying: rate limiting and transient upstream failures
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+_client: Optional[httpx.AsyncClient] = None
+
+def _get_client() -> httpx.AsyncClient:
+    """Returns the shared keep-alive client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {settings.JINAAI_API_KEY}"
+            },
+            timeout=httpx.Timeout(
+                settings.EMBEDDING_TIMEOUT_SECONDS,
+                connect=settings.EMBEDDING_CONNECT_TIMEOUT_SECONDS
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.EMBEDDING_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.EMBEDDING_MAX_CONNECTIONS,
+                keepalive_expiry=60
+            ),
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def _request_embeddings(texts: list[str]) -> list[list]:
+    """Generates embeddings for several texts in one Jina AI request."""
+    if not texts:
+        return []
+
     payload = {
-        "input": [text],
-        "model": "jina-embeddings-v2-base-en"
+        "input": texts,
+        "model": EMBEDDING_MODEL
     }
-    try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        if "data" in data and data["data"]:
-            return data["data"][0]["embedding"]
-        else:
+    attempts = settings.EMBEDDING_MAX_RETRIES + 1
+    for attempt in range(attempts):
+        try:
+            response = await _get_client().post(JINA_EMBEDDINGS_URL, json=payload)
+            if response.status_code in _RETRYABLE_STATUS and attempt < attempts - 1:
+                raise httpx.HTTPStatusError(
+                    f"Retryable status {response.status_code}", request=response.request, response=response
+                )
+            response.raise_for_status()
+            data = response.json()
+            if "data" in data and len(data["data"]) == len(texts):
+                # Jina tags each vector with the index of its input
+                return [item["embedding"] for item in sorted(data["data"], key=lambda item: item["index"])]
             raise HTTPException(status_code=500, detail="No embeddings returned from Jina AI API.")
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"Jina AI API request failed: {str(e)}")
\ No newline at end of file
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            retryable = isinstance(e, httpx.TransportError) or e.response.status_code in _RETRYABLE_STATUS
+            if not retryable or attempt == attempts - 1:
+                raise HTTPException(status_code=500, detail=f"Jina AI API request failed: {str(e)}")
+            # Exponential backoff with full jitter
+            delay = random.uniform(0, settings.EMBEDDING_RETRY_BASE_DELAY_SECONDS * (2 ** attempt))
+            logger.warning(f"Jina AI request failed ({e}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+async def _embed_uncached(texts: list[str]) -> list[list]:
+    """Embeds normalized texts that missed the memory cache, checking the Neon tier before Jina AI."""
+    digests = [text_hash(text) for text in texts]
+    found = await embedding_cache.get_persistent(EMBEDDING_MODEL, digests)
+
+    missing = {digest: text for digest, text in zip(digests, texts) if digest not in found}
+    if missing:
+        vectors = await _request_embeddings(list(missing.values()))
+        fresh = dict(zip(missing.keys(), vectors))
+        embedding_cache.put_many(EMBEDDING_MODEL, fresh)
+        found.update(fresh)
+
+    return [found[digest] for digest in digests]
+
+async def get_embeddings(texts: list[str]) -> list[list]:
+    """Generates embeddings for several texts, reusing cached vectors where possible."""
+    texts = [normalize_text(text) for text in texts]
+    results = [embedding_cache.get(EMBEDDING_MODEL, text_hash(text)) for text in texts]
+
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, results) if vector is None))
+    if missing:
+        by_text = dict(zip(missing, await _embed_uncached(missing)))
+        results = [vector if vector is not None else by_text[text] for text, vector in zip(texts, results)]
+    return results
+
+# Single-text requests from concurrent chat turns share upstream calls
+_batcher = EmbeddingBatcher(
+    _embed_uncached,
+    window=settings.EMBEDDING_BATCH_WINDOW_MS / 1000,
+    max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+    max_inflight=settings.EMBEDDING_BATCH_MAX_INFLIGHT,
+)
+
+async def get_embedding(text: str) -> list:
+    """Generates embeddings using Jina AI."""
+    text = normalize_text(text)
+    cached = embedding_cache.get(EMBEDDING_MODEL, text_hash(text))
+    if cached is not None:
+        return cached
+    return await _batcher.embed(text)
+
+def get_embedding_stats() -> dict:
+    return {"batcher": _batcher.stats(), "cache": embedding_cache.stats()}
@@ -1,7 +1,4 @@
-import asyncio
-import json
 import google.generativeai as genai
-from fastapi import HTTPException
 from app.core.config import settings
 import logging
 
@@ -10,22 +7,40 @@ logger = logging.getLogger(__name__)
 genai.configure(api_key=settings.GEMINI_API_KEY) # Configure Gemini API key
 model = genai.GenerativeModel("gemini-2.0-flash")
 
-def generate_response_with_gemini_streaming(prompt: str):
-    """Calls Google Gemini API and returns a streaming response."""
+GENERATION_CONFIG = {
+    "temperature": 0.3,
+    "max_output_tokens": 3072,
+    "response_mime_type": "text/plain"
+}
 
-    response_stream = model.generate_content(
+async def generate_response_with_gemini_streaming(prompt: str):
+    """Streams a Google Gemini response, yielding the text of each chunk as soon as it arrives.
+
+    Uses the SDK's async client, so waiting for the next chunk never blocks
+    the event loop and other streams keep flowing. Encoding the text for
+    the client is left to the caller. Cancelling the task that waits on the
+    next chunk cancels the upstream call: grpc.aio cancels the RPC when a
+    CancelledError reaches its pending read.
+    """
+    response_stream = await model.generate_content_async(
         prompt,
         stream=True,
-        generation_config={
-            "temperature": 0.3,
-            "max_output_tokens": 3072,
-            "response_mime_type": "text/plain"
-        },
+        generation_config=GENERATION_CONFIG,
     )
 
-    async def text_streamer():
-        for chunk in response_stream:
-            if chunk.text:
-                yield f"data: {json.dumps({'type': 'answer_chunk', 'text': chunk.text})}\n\n"
-            await asyncio.sleep(0.01)
-    return text_streamer()
\ No newline at end of file
+    async for chunk in response_stream:
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts, e.g. the final one carrying only a finish reason
+            continue
+        if text:
+            yield text
+
+async def generate_text(prompt: str, max_output_tokens: int = 1024) -> str:
+    """Returns a complete, non-streamed Gemini response."""
+    response = await model.generate_content_async(
+        prompt,
+        generation_config={**GENERATION_CONFIG, "max_output_tokens": max_output_tokens},
+    )
+    return response.text
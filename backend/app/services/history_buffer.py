@@ -0,0 +1,86 @@
+import logging
+from collections import deque
+from typing import Optional
+
+from sqlalchemy import select
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.models import db_models
+from app.services.message_writer import message_writer
+
+logger = logging.getLogger(__name__)
+
+
+class _SessionRing:
+    """The latest messages of one session, as {"role", "content"} dicts."""
+
+    def __init__(self, size: int, messages: list[dict]):
+        self.messages = deque(messages, maxlen=size)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(message["content"] or "") for message in self.messages)
+
+
+class HistoryBuffer:
+    """Bounded per-session ring buffers of recent chat messages.
+
+    Only sessions created before recent_messages existed read their prompt
+    history from messages; a miss is loaded from the database and dropped
+    once the session's next exchange is recorded. Sessions are evicted least
+    recently used first once the messages of all sessions exceed `max_bytes`.
+    """
+
+    def __init__(self, messages_per_session: int, max_bytes: int):
+        self.messages_per_session = messages_per_session
+        self._rings = LRUCache(max_bytes=max_bytes, sizeof=lambda ring: ring.nbytes)
+
+    def get(self, chat_session_id: int) -> Optional[list[dict]]:
+        ring = self._rings.get(chat_session_id)
+        return list(ring.messages) if ring is not None else None
+
+    def seed(self, chat_session_id: int, messages: list[dict]):
+        self._rings.set(chat_session_id, _SessionRing(self.messages_per_session, messages))
+
+    def invalidate(self, chat_session_id: int):
+        self._rings.pop(chat_session_id)
+
+    def stats(self) -> dict:
+        return self._rings.stats()
+
+
+history_buffer = HistoryBuffer(
+    messages_per_session=settings.HISTORY_BUFFER_MESSAGES,
+    max_bytes=settings.HISTORY_BUFFER_MAX_BYTES,
+)
+
+
+async def load_recent_messages(db, chat_session_id: int) -> list[dict]:
+    """Returns the session's latest messages, oldest first, from the buffer or the database."""
+    messages = history_buffer.get(chat_session_id)
+    if messages is not None:
+        return messages
+
+    # Taken before the query, so rows committed in between are found in one of the two
+    pending = message_writer.pending_rows(chat_session_id)
+    result = await db.execute(
+        select(db_models.ChatMessage)
+        .where(db_models.ChatMessage.session_id == chat_session_id)
+        .order_by(db_models.ChatMessage.created_at.desc())
+        .limit(history_buffer.messages_per_session)
+    )
+    rows = list(reversed(result.scalars().all()))
+    # Messages still queued in the write-behind writer are newer than anything stored
+    last_stored = rows[-1].created_at if rows else None
+    messages = [
+        {"role": "user" if msg.is_user_message else "assistant", "content": msg.content}
+        for msg in rows
+    ] + [
+        {"role": "user" if row["is_user_message"] else "assistant", "content": row["content"]}
+        for row in pending
+        if last_stored is None or row["created_at"] > last_stored
+    ]
+    messages = messages[-history_buffer.messages_per_session:]
+    history_buffer.seed(chat_session_id, messages)
+    return messages
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services import pdf_service
+from app.services.upload_spool import SpooledUpload
+
+logger = logging.getLogger(__name__)
+
+# "completed_with_warnings": the PDF was saved, but its chunks could not be stored for search
+TERMINAL_STATUSES = {"completed", "completed_with_warnings", "failed"}
+
+
+@dataclass
+class IngestionJob:
+    id: str
+    user_id: int
+    filename: str
+    status: str = "queued"
+    progress: dict = field(default_factory=dict)
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    # Status changes only, as (revision, event); progress within a stage is just `progress`
+    events: list = field(default_factory=list)
+    revision: int = 0
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+        }
+
+    def update(self, status: Optional[str] = None, **progress):
+        """Records a stage change or progress update and wakes up event listeners.
+
+        Only stage changes are kept as events, so a finished job holds a
+        handful of them however many pages its PDF had.
+        """
+        self.progress.update(progress)
+        self.revision += 1
+        if status is not None:
+            self.status = status
+            self.events.append((self.revision, {"status": self.status, "progress": dict(self.progress)}))
+        # Wake current listeners, then arm the event for the next update
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class IngestionQueue:
+    """Bounded background worker pool for PDF ingestion.
+
+    Jobs live in this process only; finished jobs are kept for
+    PDF_JOB_RETENTION_SECONDS so clients can read their result.
+    """
+
+    def __init__(self, workers: int, max_queued: int, per_user_limit: int, retention: float):
+        self.workers = workers
+        self.per_user_limit = per_user_limit
+        self.retention = retention
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._jobs: dict[str, IngestionJob] = {}
+        self._active_by_user: dict[int, int] = defaultdict(int)
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Drop spooled files of jobs that never ran
+        while not self._queue.empty():
+            job, upload = self._queue.get_nowait()
+            upload.remove()
+
+    def check_capacity(self, user_id: int):
+        """Raises 429 if the user or the server already has as many jobs as allowed."""
+        if self._active_by_user.get(user_id, 0) >= self.per_user_limit:
+            raise HTTPException(status_code=429, detail="Too many PDFs are already being processed for this account")
+        if self._queue.full():
+            raise HTTPException(status_code=429, detail="The server is busy processing PDFs, please try again shortly")
+
+    def submit(self, upload: SpooledUpload, user_id: int) -> IngestionJob:
+        """Queues an upload for ingestion, or raises 429 if the user or the server is at capacity."""
+        self._prune()
+        self.check_capacity(user_id)
+
+        job = IngestionJob(id=uuid.uuid4().hex, user_id=user_id, filename=upload.filename)
+        self._queue.put_nowait((job, upload))
+        self._jobs[job.id] = job
+        self._active_by_user[user_id] += 1
+        job.update("queued")
+        return job
+
+    def get(self, job_id: str, user_id: int) -> Optional[IngestionJob]:
+        job = self._jobs.get(job_id)
+        return job if job is not None and job.user_id == user_id else None
+
+    async def events(self, job: IngestionJob) -> AsyncIterator[dict]:
+        """Yields every stage change of a job until it finishes, each followed by its latest progress.
+
+        A listener that falls behind skips intermediate progress, not stages.
+        """
+        sent = 0
+        seen = 0
+        while True:
+            changed = job.changed
+            while sent < len(job.events):
+                seen, event = job.events[sent]
+                yield event
+                sent += 1
+            if job.status in TERMINAL_STATUSES:
+                return
+            if seen != job.revision:
+                seen = job.revision
+                yield {"status": job.status, "progress": dict(job.progress)}
+                continue
+            await changed.wait()
+
+    async def _worker(self):
+        while True:
+            job, upload = await self._queue.get()
+            try:
+                async with AsyncSessionLocal() as db:
+                    result = await pdf_service.process_pdf_and_store(upload, job.user_id, db, report=job.update)
+                job.result = jsonable_encoder(result)
+                job.update("completed_with_warnings" if job.result.get("warning") else "completed")
+            except asyncio.CancelledError:
+                job.error = "Server shutting down"
+                job.update("failed")
+                raise
+            except HTTPException as e:
+                job.error = e.detail
+                job.update("failed")
+            except Exception as e:
+                logger.error(f"Ingestion job {job.id} failed: {str(e)}", exc_info=True)
+                job.error = f"Failed to process PDF: {str(e)}"
+                job.update("failed")
+            finally:
+                upload.remove()
+                job.finished_at = time.time()
+                self._active_by_user[job.user_id] -= 1
+                if not self._active_by_user[job.user_id]:
+                    del self._active_by_user[job.user_id]
+                self._queue.task_done()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+ingestion_queue = IngestionQueue(
+    workers=settings.PDF_JOB_WORKERS,
+    max_queued=settings.PDF_JOB_QUEUE_SIZE,
+    per_user_limit=settings.PDF_JOBS_PER_USER,
+    retention=settings.PDF_JOB_RETENTION_SECONDS,
+)
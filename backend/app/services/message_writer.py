@@ -0,0 +1,273 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import db_models
+
+logger = logging.getLogger(__name__)
+
+
+class _AppendLog:
+    """JSON-lines log of submitted batches, so queued messages survive a crash.
+
+    Each batch is written as an "add" record before it is queued and marked
+    by a "done" record once committed. The file is truncated whenever no
+    batch is outstanding.
+    """
+
+    def __init__(self, path: str, fsync: bool):
+        self.path = path
+        self.fsync = fsync
+        self._file = None
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def pending(self) -> dict[int, list[dict]]:
+        """Batches that were added but never marked done."""
+        pending: dict[int, list[dict]] = {}
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-write
+                        continue
+                    if record["op"] == "add":
+                        pending[record["id"]] = record["rows"]
+                    else:
+                        for batch_id in record["ids"]:
+                            pending.pop(batch_id, None)
+        except FileNotFoundError:
+            pass
+        return pending
+
+    def write(self, record: dict):
+        self._file.write(json.dumps(record, default=str) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def truncate(self):
+        self._file.truncate(0)
+        self._file.seek(0)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _restore_row(row: dict) -> dict:
+    row = dict(row)
+    if isinstance(row.get("created_at"), str):
+        row["created_at"] = datetime.fromisoformat(row["created_at"])
+    if isinstance(row.get("client_id"), str):
+        row["client_id"] = uuid.UUID(row["client_id"])
+    return row
+
+
+async def migrate_chat_messages(conn):
+    """Adds the idempotency key the writer inserts with to existing chat_messages tables."""
+    await conn.execute(text("ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS client_id UUID"))
+    await conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_chat_messages_client_id ON chat_messages (client_id)"
+    ))
+
+
+class MessageWriter:
+    """Write-behind persistence of ChatMessage rows.
+
+    Streams hand their messages to `submit` and finish without waiting on
+    the database; a background task inserts queued messages in multi-row
+    batches on its own session. Every row carries a `client_id`, and rows
+    whose key is already stored are skipped, so a batch replayed from the
+    log after it was committed, or retried after an ambiguous commit, is
+    not inserted twice.
+    """
+
+    def __init__(self, max_queued: int, batch_size: int, flush_interval: float, log: Optional[_AppendLog] = None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.log = log
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._task: Optional[asyncio.Task] = None
+        self._next_id = 0
+        self._outstanding = 0
+        # Rows submitted but not yet committed, by batch id
+        self._pending: dict[int, list[dict]] = {}
+        self.written = 0
+        self.failures = 0
+
+    async def start(self):
+        """Replays batches left in the append log, then starts the background writer."""
+        if self.log is not None:
+            pending = self.log.pending()
+            self.log.open()
+            self.log.truncate()
+            if pending:
+                rows = [_restore_row(row) for batch in pending.values() for row in batch]
+                logger.info(f"Replaying {len(rows)} chat messages from {self.log.path}")
+                await self.submit(rows)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, rows: list[dict]):
+        """Queues ChatMessage rows for insertion; waits only if the queue is full."""
+        batch_id = self._next_id
+        self._next_id += 1
+        if self.log is not None:
+            self.log.write({"op": "add", "id": batch_id, "rows": rows})
+        self._outstanding += 1
+        self._pending[batch_id] = rows
+        await self._queue.put((batch_id, rows))
+
+    def pending_rows(self, chat_session_id: int) -> list[dict]:
+        """Rows of a session that are queued or being written, oldest first."""
+        return [row for rows in self._pending.values() for row in rows if row["session_id"] == chat_session_id]
+
+    async def _take_batch(self) -> list[tuple[int, list[dict]]]:
+        items = [await self._queue.get()]
+        count = len(items[0][1])
+        deadline = time.monotonic() + self.flush_interval
+        while count < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            items.append(item)
+            count += len(item[1])
+        return items
+
+    async def _insert(self, rows: list[dict]):
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                insert(db_models.ChatMessage).on_conflict_do_nothing(index_elements=["client_id"]), rows
+            )
+            await db.commit()
+
+    async def _insert_each(self, rows: list[dict]):
+        """Inserts rows one by one, skipping those the database rejects.
+
+        Each row is removed from `rows` once handled, so if another error
+        escapes, retrying `rows` does not insert the committed ones again.
+        """
+        while rows:
+            try:
+                await self._insert(rows[:1])
+                self.written += 1
+            except IntegrityError:
+                # e.g. the session was deleted while its messages were queued
+                logger.warning(f"Dropping chat message of session {rows[0]['session_id']} rejected by the database")
+            del rows[0]
+
+    async def _write(self, items: list[tuple[int, list[dict]]]):
+        rows = [row for _, batch in items for row in batch]
+        one_by_one = False
+        delay = 0.5
+        while rows:
+            try:
+                if not one_by_one:
+                    try:
+                        await self._insert(rows)
+                        self.written += len(rows)
+                        break
+                    except IntegrityError:
+                        # Retrying the batch would fail forever; keep the rows that are still valid
+                        one_by_one = True
+                await self._insert_each(rows)
+            except Exception as e:
+                # Keep the unwritten rows and retry; they are still in the append log if we crash meanwhile
+                self.failures += 1
+                logger.error(f"Writing {len(rows)} chat messages failed, retrying in {delay:.1f}s: {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+        self._outstanding -= len(items)
+        for batch_id, _ in items:
+            self._pending.pop(batch_id, None)
+        if self.log is not None:
+            if self._outstanding == 0:
+                self.log.truncate()
+            else:
+                self.log.write({"op": "done", "ids": [batch_id for batch_id, _ in items]})
+
+    async def _run(self):
+        while True:
+            items = await self._take_batch()
+            try:
+                await self._write(items)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    async def flush(self, timeout: Optional[float] = None):
+        """Waits until everything queued so far has been written."""
+        await asyncio.wait_for(self._queue.join(), timeout)
+
+    async def stop(self, timeout: Optional[float] = None):
+        """Flushes queued messages and stops the writer. Unwritten batches stay in the log."""
+        try:
+            if self._task is not None:
+                await self.flush(timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self._queue.qsize()} chat message batches not written before shutdown")
+        finally:
+            if self._task is not None:
+                self._task.cancel()
+                await asyncio.gather(self._task, return_exceptions=True)
+                self._task = None
+            if self.log is not None:
+                self.log.close()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "outstanding_batches": self._outstanding,
+            "written": self.written,
+            "failures": self.failures,
+        }
+
+
+def message_row(chat_session_id: int, user_id: Optional[int], content: str, is_user_message: bool,
+                search_data: Optional[str] = None, created_at: Optional[datetime] = None) -> dict:
+    """A ChatMessage row for `MessageWriter.submit`.
+
+    Timestamped here rather than by the database, so message order does not
+    depend on when the batch is written, and keyed so it is written once.
+    """
+    return {
+        "client_id": uuid.uuid4(),
+        "session_id": chat_session_id,
+        "user_id": user_id,
+        "content": content,
+        "is_user_message": is_user_message,
+        "search_data": search_data,
+        "created_at": created_at or datetime.now(timezone.utc),
+    }
+
+
+message_writer = MessageWriter(
+    max_queued=settings.MESSAGE_WRITER_QUEUE_SIZE,
+    batch_size=settings.MESSAGE_WRITER_BATCH_SIZE,
+    flush_interval=settings.MESSAGE_WRITER_FLUSH_INTERVAL_MS / 1000,
+    log=_AppendLog(settings.MESSAGE_LOG_PATH, fsync=settings.MESSAGE_LOG_FSYNC) if settings.MESSAGE_LOG_PATH else None,
+)
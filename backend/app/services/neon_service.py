@@ -3,26 +3,120 @@ from fastapi import HTTPException
 from sqlalchemy import select, text
 from sqlalchemy.orm import Session
 from app.models.db_models import DocumentChunk
+from app.services import vector_index
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def search_neon_chunks(query_embedding: list, user_id: int, pdf_ids: list = None, top_n: int = 5):
-    """Searches NeonDB for similar documents using vector similarity with the <=> operator."""
+def _format_source(metadata: dict) -> str:
+    """Filename plus the page range a chunk came from, when known."""
+    source = metadata.get('filename', 'Unknown')
+    page_start, page_end = metadata.get('page_start'), metadata.get('page_end')
+    if page_start is None:
+        return source
+    if page_end is None or page_end == page_start:
+        return f"{source}, p. {page_start}"
+    return f"{source}, pp. {page_start}-{page_end}"
+
+def _load_metadata(raw) -> dict:
+    """Decodes document_metadata, whatever shape a row stores it in.
+
+    Rows written since page chunking hold a JSONB object, which arrives as a
+    dict; older rows hold a JSON-encoded (sometimes doubly encoded) string.
+    """
+    metadata = raw
+    while isinstance(metadata, str):
+        metadata = json.loads(metadata)
+    return metadata if isinstance(metadata, dict) else {}
+
+def format_chunk(chunk_text: str, raw_metadata) -> str:
+    """Renders a retrieved chunk as a source-tagged preview for the prompt."""
+    try:
+        metadata = _load_metadata(raw_metadata)
+    except Exception as e:
+        logger.error(f"Error processing chunk metadata: {str(e)}")
+        metadata = {}
+
+    # Extract a meaningful preview from the larger text
+    preview_text = chunk_text[:1000] + "..." if len(chunk_text) > 1000 else chunk_text
+    return f"[Source: {_format_source(metadata)}]\n{preview_text}"
+
+# Older rows only carry the owner and PDF inside document_metadata, sometimes
+# double-encoded as a JSON string. Copy them into the typed columns.
+_BACKFILL_SQL = """
+    UPDATE document_chunks AS dc
+    SET user_id = CASE WHEN m.meta->>'user_id' ~ '^[0-9]+$' THEN (m.meta->>'user_id')::int END,
+        pdf_document_id = CASE WHEN m.meta->>'pdf_document_id' ~ '^[0-9]+$' THEN (m.meta->>'pdf_document_id')::int END
+    FROM (
+        SELECT id,
+               CASE WHEN jsonb_typeof(document_metadata) = 'string'
+                    THEN (document_metadata #>> '{}')::jsonb
+                    ELSE document_metadata END AS meta
+        FROM document_chunks
+        WHERE user_id IS NULL AND document_metadata IS NOT NULL
+    ) AS m
+    WHERE dc.id = m.id
+"""
+
+async def migrate_document_chunks(neon_conn):
+    """Adds and backfills the typed user_id/pdf_document_id columns on existing tables."""
+    await neon_conn.execute(text("ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS user_id INTEGER"))
+    await neon_conn.execute(text("ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS pdf_document_id INTEGER"))
+    await neon_conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_document_chunks_user_id_pdf_document_id "
+        "ON document_chunks (user_id, pdf_document_id)"
+    ))
+    result = await neon_conn.execute(text(_BACKFILL_SQL))
+    if result.rowcount:
+        logger.info(f"Backfilled user_id/pdf_document_id on {result.rowcount} document chunks")
+
+_SEARCH_USER_SQL = text("""
+    SELECT id, chunk_text, document_metadata
+    FROM document_chunks
+    WHERE user_id = :user_id
+    ORDER BY embedding <=> :embedding
+    LIMIT :top_n
+""")
+
+_SEARCH_PDFS_SQL = text("""
+    SELECT id, chunk_text, document_metadata
+    FROM document_chunks
+    WHERE user_id = :user_id AND pdf_document_id = ANY(:pdf_ids)
+    ORDER BY embedding <=> :embedding
+    LIMIT :top_n
+""")
+
+async def search_neon_chunks(
+    query_embedding: list,
+    user_id: int,
+    pdf_ids: list = None,
+    top_n: int = 5,
+    ef_search: int = None,
+    probes: int = None,
+):
+    """Searches NeonDB for the user's most similar chunks using the <=> operator.
+
+    Ownership and PDF filters are applied in SQL next to the vector ordering.
+    `ef_search`/`probes` override the ANN index's recall setting for this query.
+    """
     try:
         from app.core.database import NeonAsyncSessionLocal
         
         async with NeonAsyncSessionLocal() as neon_db:
             try:
-                # Simple approach: use <=> operator for cosine similarity
-                query = f"""
-                    SELECT id, chunk_text, document_metadata 
-                    FROM document_chunks
-                    ORDER BY embedding <=> ARRAY{str(query_embedding)}::vector
-                    LIMIT {top_n * 3}
-                """
-                
-                result = await neon_db.execute(text(query))
+                # The query vector is a bind parameter, so the SQL text is constant
+                # and asyncpg reuses its prepared statement on each connection
+                params = {"embedding": query_embedding, "user_id": user_id, "top_n": top_n}
+                if pdf_ids:
+                    params["pdf_ids"] = [int(pdf_id) for pdf_id in pdf_ids]
+                    query = _SEARCH_PDFS_SQL
+                else:
+                    query = _SEARCH_USER_SQL
+
+                # SET LOCAL semantics: only lasts for this transaction
+                # Always filtered by owner, and by PDF when given
+                await vector_index.apply_search_settings(neon_db, ef_search=ef_search, probes=probes, filtered=True)
+                result = await neon_db.execute(query, params)
                 chunks = result.fetchall()
                 await neon_db.commit()  # Explicitly commit successful transaction
                 logger.info(f"Vector search successful, retrieved {len(chunks)} chunks")
@@ -32,40 +126,27 @@ async def search_neon_chunks(query_embedding: list, user_id: int, pdf_ids: list
                 logger.error(f"Vector search query failed: {str(e)}")
                 return []  # Return empty results on failure
             
-            # Process results
-            filtered_chunks = []
-            for chunk in chunks:
-                try:
-                    metadata = json.loads(chunk.document_metadata)
-                    chunk_user_id = metadata.get('user_id')
-                    chunk_pdf_id = metadata.get('pdf_document_id')
-                    
-                    # Match string representations for consistent comparison
-                    if chunk_user_id != str(user_id):
-                        continue
-                        
-                    if pdf_ids and chunk_pdf_id not in [str(pdf_id) for pdf_id in pdf_ids]:
-                        continue
-                    
-                    # Extract a meaningful preview from the larger text
-                    document_text = chunk.chunk_text
-                    preview_text = document_text[:1000] + "..." if len(document_text) > 1000 else document_text
-                    
-                    filtered_chunks.append({
-                        'text': preview_text,
-                        'metadata': metadata
-                    })
-                    
-                    if len(filtered_chunks) >= top_n:
-                        break
-                        
-                except Exception as e:
-                    logger.error(f"Error processing chunk metadata: {str(e)}")
-            
             # Format results with source information
-            return [f"[Source: {chunk['metadata'].get('filename', 'Unknown')}]\n{chunk['text']}" 
-                   for chunk in filtered_chunks]
+            return [format_chunk(chunk.chunk_text, chunk.document_metadata) for chunk in chunks]
                    
     except Exception as e:
         logger.error(f"Error searching NeonDB documents: {str(e)}", exc_info=True)
-        return []
\ No newline at end of file
+        return []
+
+
+_LOAD_PDFS_SQL = text("""
+    SELECT chunk_text, document_metadata, embedding
+    FROM document_chunks
+    WHERE user_id = :user_id AND pdf_document_id = ANY(:pdf_ids)
+    ORDER BY id
+""")
+
+async def load_pdf_chunks(user_id: int, pdf_ids: list) -> list:
+    """Loads every chunk, with its embedding, of the given PDFs owned by the user."""
+    from app.core.database import NeonAsyncSessionLocal
+
+    async with NeonAsyncSessionLocal() as neon_db:
+        result = await neon_db.execute(
+            _LOAD_PDFS_SQL, {"user_id": user_id, "pdf_ids": [int(pdf_id) for pdf_id in pdf_ids]}
+        )
+        return result.fetchall()
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException
+from PyPDF2 import PdfReader
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.PDF_WORKER_PROCESSES)
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+# The functions below run inside worker processes. Each maps the spooled
+# upload read-only, so the parser works on the page cache without copying it.
+
+def _count_pages(path: str) -> int:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return len(PdfReader(data).pages)
+
+
+def _extract_page_range(path: str, start: int, end: int) -> list[tuple[int, str]]:
+    """Extracts pages [start, end) and returns (1-based page number, text) pairs."""
+    pages = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        reader = PdfReader(data)
+        for index in range(start, end):
+            try:
+                text = reader.pages[index].extract_text() or ""
+            except Exception as e:
+                logger.warning(f"Error extracting text from page {index + 1}: {str(e)}")
+                text = ""
+            pages.append((index + 1, text))
+    return pages
+
+
+async def count_pages(path: str) -> int:
+    """Parses the PDF structure in a worker process and returns its page count."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(_get_executor(), _count_pages, path),
+            timeout=settings.PDF_EXTRACT_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=400, detail="Timed out reading the PDF")
+
+
+async def extract_pages(path: str, page_count: int) -> AsyncIterator[tuple[int, str]]:
+    """Yields (page number, text) in page order while worker processes extract the PDF.
+
+    Large documents are split into ranges of PDF_PAGES_PER_TASK pages that are
+    extracted in parallel. The whole job must finish within PDF_EXTRACT_TIMEOUT_SECONDS.
+    """
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    deadline = loop.time() + settings.PDF_EXTRACT_TIMEOUT_SECONDS
+
+    step = settings.PDF_PAGES_PER_TASK
+    futures = [
+        loop.run_in_executor(executor, _extract_page_range, path, start, min(start + step, page_count))
+        for start in range(0, page_count, step)
+    ]
+    try:
+        for future in futures:
+            try:
+                pages = await asyncio.wait_for(future, timeout=max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=400, detail="Timed out extracting text from the PDF")
+            for page in pages:
+                yield page
+    finally:
+        # Drop queued ranges if extraction failed or the consumer stopped early
+        for future in futures:
+            future.cancel()
@@ -1,58 +1,79 @@
-import io
-from PyPDF2 import PdfReader
-from fastapi import HTTPException, UploadFile
+import asyncio
+from typing import Callable, Optional
+from fastapi import HTTPException
 
 from app.models import db_models
+from app.models.auth_models import UserIdentity
 from app.models.db_models import PDFDocument, PDFChunk, DocumentChunk
 from sqlalchemy.orm import Session
-import json
 import logging
-from sqlalchemy import select
+from sqlalchemy import insert, select
+from app.core.config import settings
 from app.core.database import NeonAsyncSessionLocal
 
-from app.services import embedding_service
+from app.services import embedding_service, pdf_extraction
+from app.services.chunking import Chunk, PageChunker
+from app.services.upload_spool import SpooledUpload
 
 logger = logging.getLogger(__name__)
 
-async def process_pdf_and_store(file: UploadFile, user_id: int, db: Session):
-    """Processes PDF, generates embeddings, stores in NeonDB and metadata in PostgreSQL."""
-    if not file.filename.endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+ProgressCallback = Callable[..., None]
 
+def _no_progress(status: Optional[str] = None, **progress):
+    pass
+
+async def _embed_chunks(chunks: list[Chunk], report: ProgressCallback = _no_progress) -> list[list]:
+    """Embeds chunk texts in batches, a few batches at a time."""
+    batch_size = settings.PDF_EMBED_BATCH_SIZE
+    semaphore = asyncio.Semaphore(settings.PDF_EMBED_CONCURRENCY)
+    embedded = 0
+
+    async def embed_batch(batch: list[Chunk]) -> list[list]:
+        nonlocal embedded
+        async with semaphore:
+            embeddings = await embedding_service.get_embeddings([chunk.text for chunk in batch])
+        embedded += len(batch)
+        report(chunks_embedded=embedded)
+        return embeddings
+
+    batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
+    results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+    return [embedding for batch in results for embedding in batch]
+
+async def process_pdf_and_store(
+    upload: SpooledUpload,
+    user_id: int,
+    db: Session,
+    report: ProgressCallback = _no_progress
+):
+    """Processes PDF, generates embeddings, stores in NeonDB and metadata in PostgreSQL.
+
+    `report(status, **progress)` is called as the upload moves through the
+    extracting, embedding and storing stages.
+    """
     try:
-        # Reset file pointer and read the content
-        await file.seek(0)
-        pdf_bytes = await file.read()
-        
-        # Basic validation that it's a PDF
-        if not pdf_bytes.startswith(b'%PDF'):
-            raise HTTPException(status_code=400, detail="Invalid PDF format")
-            
-        pdf_stream = io.BytesIO(pdf_bytes)
-        reader = PdfReader(pdf_stream)
+        # Parsing is CPU-bound, so it runs in worker processes off the event loop
+        page_count = await pdf_extraction.count_pages(upload.path)
+        report("extracting", page_count=page_count, pages_done=0)
         
-        # Extract text from each page
-        text_parts = []
-        for page in reader.pages:
-            try:
-                text = page.extract_text() or ""
-                text_parts.append(text)
-                logger.info(f"Extracted {len(text)} characters from page")
-            except Exception as e:
-                logger.warning(f"Error extracting text from page: {str(e)}")
-                
-        text = "\n".join(text_parts)
-        sanitized_text = text.replace('\x00', '')
+        # Split page text into overlapping chunks as pages arrive
+        chunker = PageChunker(settings.PDF_CHUNK_TOKENS, settings.PDF_CHUNK_OVERLAP_TOKENS)
+        chunks = []
+        async for page_number, text in pdf_extraction.extract_pages(upload.path, page_count):
+            logger.debug(f"Extracted {len(text)} characters from page {page_number}")
+            chunks.extend(chunker.add_page(page_number, text))
+            report(pages_done=page_number)
+        chunks.extend(chunker.finish())
 
-        if not sanitized_text.strip():
+        if not chunks:
             raise HTTPException(status_code=400, detail="No text found in the PDF")
 
         # Store PDF Document metadata in PostgreSQL
         pdf_document_db = db_models.PDFDocument(
             user_id=user_id, 
-            filename=file.filename,
-            file_size=len(pdf_bytes),
-            page_count=len(reader.pages)
+            filename=upload.filename,
+            file_size=upload.size,
+            page_count=page_count
         )
         db.add(pdf_document_db)
         await db.commit()
@@ -60,7 +81,6 @@ async def process_pdf_and_store(file: UploadFile, user_id: int, db: Session):
 
         pdf_id = pdf_document_db.id  # Save ID before any potential rollback
         
-        # No chunking - just use the whole document text
         # Create a NeonDB session
         neon_db = NeonAsyncSessionLocal()
         try:
@@ -75,40 +95,54 @@ async def process_pdf_and_store(file: UploadFile, user_id: int, db: Session):
                 logger.error("document_chunks table does not exist in NeonDB")
                 return {
                     "id": pdf_id,
-                    "filename": file.filename,
+                    "filename": upload.filename,
                     "upload_date": pdf_document_db.upload_date,
-                    "page_count": len(reader.pages),
+                    "page_count": page_count,
                     "message": "PDF metadata saved, but vector could not be stored (database issue)",
                     "warning": "Vector database is not properly configured"
                 }
             
-            # Process the entire document as one chunk
             try:
-                # Generate embedding for the entire document
-                embedding = embedding_service.get_embedding(sanitized_text)
+                report("embedding", chunk_count=len(chunks), chunks_embedded=0)
+                embeddings = await _embed_chunks(chunks, report)
+                report("storing")
                 
-                # Create document chunk in NEON - storing the entire PDF content
-                document_chunk = db_models.DocumentChunk(
-                    chunk_text=sanitized_text,
-                    embedding=embedding,
-                    document_metadata=json.dumps({
-                        "pdf_document_id": str(pdf_id),
-                        "user_id": str(user_id),
-                        "filename": file.filename,
-                        "full_document": "true"  # Flag to indicate this is a whole document
-                    })
+                # Bulk insert the chunks into NEON; SQLAlchemy batches these into multi-row INSERTs
+                result = await neon_db.execute(
+                    insert(DocumentChunk).returning(DocumentChunk.id, sort_by_parameter_order=True),
+                    [
+                        {
+                            "chunk_text": chunk.text,
+                            "embedding": embedding,
+                            "user_id": user_id,
+                            "pdf_document_id": pdf_id,
+                            "document_metadata": {
+                                "pdf_document_id": str(pdf_id),
+                                "user_id": str(user_id),
+                                "filename": upload.filename,
+                                "chunk_index": chunk.index,
+                                "page_start": chunk.page_start,
+                                "page_end": chunk.page_end
+                            }
+                        }
+                        for chunk, embedding in zip(chunks, embeddings)
+                    ]
                 )
-                neon_db.add(document_chunk)
-                await neon_db.flush()
+                neon_chunk_ids = result.scalars().all()
                 
-                # Store reference in PDF chunks table (in PostgreSQL)
-                pdf_chunk = db_models.PDFChunk(
-                    pdf_document_id=pdf_id,
-                    chunk_index=0,  # Only one chunk now
-                    neon_db_chunk_id=str(document_chunk.id)
+                # Store references in PDF chunks table (in PostgreSQL)
+                await db.execute(
+                    insert(PDFChunk),
+                    [
+                        {
+                            "pdf_document_id": pdf_id,
+                            "chunk_index": chunk.index,
+                            "neon_db_chunk_id": str(neon_chunk_id)
+                        }
+                        for chunk, neon_chunk_id in zip(chunks, neon_chunk_ids)
+                    ]
                 )
-                db.add(pdf_chunk)
-                logger.info(f"Added full document with ID {document_chunk.id}")
+                logger.info(f"Stored {len(chunks)} chunks for PDF {pdf_id}")
                 
                 # Commit both databases
                 await neon_db.commit()
@@ -118,9 +152,9 @@ async def process_pdf_and_store(file: UploadFile, user_id: int, db: Session):
                 logger.error(f"Error processing document: {str(e)}", exc_info=True)
                 return {
                     "id": pdf_id,
-                    "filename": file.filename,
+                    "filename": upload.filename,
                     "upload_date": pdf_document_db.upload_date,
-                    "page_count": len(reader.pages),
+                    "page_count": page_count,
                     "message": "PDF metadata saved, but vector processing failed",
                     "warning": str(e)
                 }
@@ -131,11 +165,18 @@ async def process_pdf_and_store(file: UploadFile, user_id: int, db: Session):
         
         return {
             "id": pdf_id,
-            "filename": file.filename,
+            "filename": upload.filename,
             "upload_date": pdf_document_db.upload_date,
-            "page_count": len(reader.pages),
+            "page_count": page_count,
+            "chunk_count": len(chunks),
             "message": "PDF uploaded and processed successfully!"
         }
+    except HTTPException:
+        try:
+            await db.rollback()
+        except:
+            pass
+        raise
     except Exception as e:
         # Make sure to rollback on failure
         try:
@@ -145,7 +186,7 @@ async def process_pdf_and_store(file: UploadFile, user_id: int, db: Session):
         logger.error(f"Error processing PDF: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
 
-async def list_user_pdfs_handler(current_user: db_models.User, db: Session) -> list[dict]:
+async def list_user_pdfs_handler(current_user: UserIdentity, db: Session) -> list[dict]:
     """Handler for listing user PDFs, offloaded from route."""
     pdfs = await db.execute(
         select(db_models.PDFDocument)
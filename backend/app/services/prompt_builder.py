@@ -0,0 +1,175 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+from app.core.config import settings
+from app.core.tokens import TOKEN_PATTERN, count_tokens
+
+# Items this short are not worth including once a section is nearly full
+_MIN_TRUNCATED_TOKENS = 40
+# Items sharing this fraction of their word shingles with earlier ones are dropped
+_DUPLICATE_OVERLAP = 0.8
+_SHINGLE_SIZE = 5
+
+INSTRUCTIONS = """Instructions:
+1. Maintain the conversation flow by referring to previous exchanges when relevant.
+3. When including code snippets:
+- Use triple backticks with the language name for syntax highlighting (```python, ```javascript, etc.)
+- Ensure code is properly indented and follows best practices
+- Add brief comments explaining key parts of the code
+- For React code, use ```jsx for proper syntax highlighting
+4. Provide clear explanations and examples to help the user understand the topic.
+5. Provide Code examples when possible to help the user implement the solution.
+6. If you need more information, ask the user for clarification.
+7. If you need to search the web for more information, let the user know."""
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts `text` after its first `max_tokens` tokens."""
+    if max_tokens <= 0:
+        return ""
+    for i, match in enumerate(TOKEN_PATTERN.finditer(text)):
+        if i == max_tokens - 1:
+            end = match.end()
+            return text if end >= len(text.rstrip()) else text[:end] + "..."
+    return text
+
+
+def _shingles(text: str) -> set:
+    words = [w.lower() for w in TOKEN_PATTERN.findall(text)]
+    if len(words) <= _SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1)}
+
+
+@dataclass
+class SectionReport:
+    tokens: int = 0
+    included: int = 0
+    truncated: int = 0
+    duplicates: int = 0
+    dropped: int = 0
+
+
+@dataclass
+class PromptReport:
+    sections: dict = field(default_factory=dict)
+    total_tokens: int = 0
+
+    def to_dict(self) -> dict:
+        return {"total_tokens": self.total_tokens, **{name: vars(r) for name, r in self.sections.items()}}
+
+
+def _fit_section(items: list[str], budget: int, report: SectionReport, seen: set) -> list[str]:
+    """Keeps `items`, most relevant first, until `budget` tokens are used.
+
+    Near-duplicates of anything kept earlier (in this or a previous section)
+    are skipped, and the item that crosses the budget is truncated.
+    """
+    kept = []
+    for item in items:
+        remaining = budget - report.tokens
+        if remaining < _MIN_TRUNCATED_TOKENS:
+            report.dropped += 1
+            continue
+
+        shingles = _shingles(item)
+        if shingles and len(shingles & seen) >= _DUPLICATE_OVERLAP * len(shingles):
+            report.duplicates += 1
+            continue
+
+        tokens = count_tokens(item)
+        if tokens > remaining:
+            item = truncate_to_tokens(item, remaining)
+            tokens = count_tokens(item)
+            shingles = _shingles(item)
+            report.truncated += 1
+        seen.update(shingles)
+        kept.append(item)
+        report.tokens += tokens
+        report.included += 1
+    return kept
+
+
+class PromptBuilder:
+    """Assembles the chat prompt within a token budget per section."""
+
+    def __init__(self, summary_tokens: int, history_tokens: int, document_tokens: int, web_tokens: int, query_tokens: int):
+        self.summary_tokens = summary_tokens
+        self.history_tokens = history_tokens
+        self.document_tokens = document_tokens
+        self.web_tokens = web_tokens
+        self.query_tokens = query_tokens
+
+    def build(
+        self,
+        query: str,
+        history: list[str],
+        documents: list[str],
+        web_results: Optional[list[dict]] = None,
+        document_note: str = "",
+        summary: str = "",
+    ) -> tuple[str, PromptReport]:
+        """Returns the prompt and its token breakdown.
+
+        `summary` covers the conversation before `history`, which is
+        chronological and trimmed from the oldest message;
+        `documents` and `web_results` are ranked and trimmed from the end.
+        `document_note` stands in for the documents when none are kept.
+        `web_results` is None when web search is off.
+        """
+        report = PromptReport()
+        seen: set = set()
+
+        query_report = report.sections["query"] = SectionReport(included=1)
+        if count_tokens(query) > self.query_tokens:
+            query = truncate_to_tokens(query, self.query_tokens)
+            query_report.truncated = 1
+        query_report.tokens = count_tokens(query)
+
+        # The user's own documents go first, so web results repeating them are the ones dropped
+        report.sections["documents"] = SectionReport()
+        kept_documents = _fit_section(documents, self.document_tokens, report.sections["documents"], seen)
+        if kept_documents:
+            document_context = "Here are the most relevant sections from your documents:\n\n" + "\n\n".join(kept_documents)
+        else:
+            document_context = document_note
+
+        web_section = ""
+        if web_results is not None:
+            web_items = [
+                f"{result.get('title') or 'Untitled'} ({result.get('url')})\n{result.get('content') or ''}"
+                for result in sorted(web_results, key=lambda r: r.get("score") or 0, reverse=True)
+            ]
+            report.sections["web"] = SectionReport()
+            kept = _fit_section(web_items, self.web_tokens, report.sections["web"], seen)
+            web_section = "**Web Search Results:**\n" + ("\n\n".join(kept) or "No additional web info found.") + "\n\n"
+
+        # Newest messages matter most, so fill the budget from the end
+        report.sections["history"] = SectionReport()
+        kept_history = _fit_section(list(reversed(history)), self.history_tokens, report.sections["history"], set())
+        chat_history = "\n".join(reversed(kept_history)) or "No previous messages in this chat."
+        if summary:
+            report.sections["summary"] = SectionReport()
+            kept_summary = _fit_section([summary], self.summary_tokens, report.sections["summary"], set())
+            if kept_summary:
+                chat_history = f"Summary of the earlier conversation:\n{kept_summary[0]}\n\nRecent messages:\n{chat_history}"
+
+        prompt = (
+            "You are a helpful assistant. Answer the user's question based on the provided information.\n\n"
+            f"{web_section}"
+            f"**Document Context:**\n{document_context}\n\n"
+            f"**Chat History:**\n{chat_history}\n\n"
+            f"**User Question:** {query}\n\n"
+            f"{INSTRUCTIONS}"
+        )
+        report.total_tokens = count_tokens(prompt)
+        return prompt, report
+
+
+prompt_builder = PromptBuilder(
+    summary_tokens=settings.PROMPT_SUMMARY_TOKENS,
+    history_tokens=settings.PROMPT_HISTORY_TOKENS,
+    document_tokens=settings.PROMPT_DOCUMENT_TOKENS,
+    web_tokens=settings.PROMPT_WEB_TOKENS,
+    query_tokens=settings.PROMPT_QUERY_TOKENS,
+)
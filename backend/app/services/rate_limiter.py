@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# The SQLite backend deletes expired buckets once per this many hits
+_PURGE_EVERY = 1000
+
+
+class RateLimiterUnavailable(Exception):
+    """The shared limiter could not be checked, so the request should be refused."""
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    # Whole requests left after this one
+    remaining: int
+    # Seconds until the next request would be allowed, 0 if one is allowed now
+    retry_after: float
+
+
+class TokenBucket:
+    """Token bucket maths shared by the backends.
+
+    Each key may spend `limit` requests at once, and the bucket refills
+    evenly over `window` seconds. A bucket left alone for `window` seconds is
+    full again, so its state can be forgotten after that long.
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.rate = limit / window
+
+    def refill(self, tokens: float, updated: float, now: float) -> float:
+        return min(self.limit, tokens + (now - updated) * self.rate)
+
+    def result(self, allowed: bool, tokens: float, cost: int) -> RateLimitResult:
+        retry_after = 0.0 if tokens >= cost else (cost - tokens) / self.rate
+        return RateLimitResult(allowed=allowed, remaining=int(tokens), retry_after=retry_after)
+
+
+class MemoryRateLimiter(TokenBucket):
+    """Per-process limiter keeping one bucket per key in a bounded LRU.
+
+    Buckets expire once full again; under memory pressure the least
+    recently seen key is evicted, which resets its limit.
+    """
+
+    def __init__(self, limit: int, window: float, max_keys: int):
+        super().__init__(limit, window)
+        self._buckets = LRUCache(max_entries=max_keys, ttl=window)
+
+    async def hit(self, key: str, cost: int = 1) -> RateLimitResult:
+        """Spends `cost` tokens of `key` if it has them."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key, count=False)
+        tokens = self.limit if bucket is None else self.refill(bucket[0], bucket[1], now)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets.set(key, (tokens, now))
+        return self.result(allowed, tokens, cost)
+
+    def close(self):
+        self._buckets.clear()
+
+    async def stats(self) -> dict:
+        return {"backend": "memory", "keys": len(self._buckets), "evictions": self._buckets.evictions}
+
+
+class SQLiteRateLimiter(TokenBucket):
+    """Limiter sharing its buckets with other workers through a local SQLite file.
+
+    Each hit is a single UPSERT, so concurrent workers can't both spend the
+    last token. Hits run on a dedicated thread, which owns the connection,
+    so waiting up to `busy` seconds on another worker's write never blocks
+    the event loop. A hit that still finds the file locked is retried once,
+    then raises RateLimiterUnavailable rather than let the request through.
+    """
+
+    def __init__(self, limit: int, window: float, path: str, busy: float):
+        super().__init__(limit, window)
+        self.path = path
+        self.busy = busy
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limiter")
+        self._db: Optional[sqlite3.Connection] = None
+        self._hits = 0
+        self.unavailable = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=self.busy, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+        return self._db
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def hit(self, key: str, cost: int = 1) -> RateLimitResult:
+        """Spends `cost` tokens of `key` if it has them."""
+        for _ in range(2):
+            try:
+                return await self._run(self._hit, key, cost)
+            except sqlite3.OperationalError as e:
+                # e.g. "database is locked" past the busy timeout
+                error = e
+        self.unavailable += 1
+        logger.warning(f"Rate limiter unavailable, refusing request: {str(error)}")
+        raise RateLimiterUnavailable(str(error))
+
+    def _hit(self, key: str, cost: int) -> RateLimitResult:
+        db = self._connect()
+        # Wall clock, as buckets are shared between processes
+        now = time.time()
+        row = db.execute(
+            """
+            INSERT INTO rate_limit_buckets (key, tokens, updated) VALUES (:key, :limit - :cost, :now)
+            ON CONFLICT (key) DO UPDATE SET
+                tokens = min(:limit, tokens + (:now - updated) * :rate) - :cost,
+                updated = :now
+            WHERE min(:limit, tokens + (:now - updated) * :rate) >= :cost
+            RETURNING tokens
+            """,
+            {"key": key, "limit": self.limit, "cost": cost, "now": now, "rate": self.rate},
+        ).fetchone()
+
+        self._hits += 1
+        if self._hits % _PURGE_EVERY == 0:
+            db.execute("DELETE FROM rate_limit_buckets WHERE updated < ?", (now - self.window,))
+
+        if row is not None:
+            return self.result(True, row[0], cost)
+        # Denied: the bucket is left untouched, read it to report when it refills
+        tokens, updated = db.execute(
+            "SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)
+        ).fetchone()
+        return self.result(False, self.refill(tokens, updated, now), cost)
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def close(self):
+        self._executor.submit(self._close).result()
+        self._executor.shutdown()
+
+    def _count_keys(self) -> int:
+        return self._connect().execute("SELECT count(*) FROM rate_limit_buckets").fetchone()[0]
+
+    async def stats(self) -> dict:
+        keys = await self._run(self._count_keys)
+        return {"backend": "sqlite", "keys": keys, "path": self.path, "unavailable": self.unavailable}
+
+
+def create_rate_limiter(backend: str, limit: int, window: float, max_keys: int, sqlite_path: str,
+                        sqlite_busy: float):
+    """Builds the limiter named by `backend` ("memory" or "sqlite")."""
+    if backend == "sqlite":
+        return SQLiteRateLimiter(limit, window, sqlite_path, sqlite_busy)
+    if backend != "memory":
+        logger.warning(f"Unknown rate limiter backend {backend!r}, using memory")
+    return MemoryRateLimiter(limit, window, max_keys)
+
+
+# Messages an anonymous visitor may send before being asked to sign in
+anonymous_limiter = create_rate_limiter(
+    backend=settings.ANONYMOUS_LIMITER_BACKEND,
+    limit=settings.ANONYMOUS_MESSAGE_LIMIT,
+    window=settings.ANONYMOUS_LIMIT_WINDOW_SECONDS,
+    max_keys=settings.ANONYMOUS_LIMITER_MAX_KEYS,
+    sqlite_path=settings.ANONYMOUS_LIMITER_SQLITE_PATH,
+    sqlite_busy=settings.ANONYMOUS_LIMITER_SQLITE_BUSY_MS / 1000,
+)
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from pgvector import Vector
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.services import neon_service
+
+logger = logging.getLogger(__name__)
+
+# Sessions remembered as too large to cache
+_MAX_OVERSIZED = 1024
+
+
+@dataclass
+class SessionVectors:
+    """Normalized chunk embeddings of one chat session's PDFs, one row per chunk."""
+    fingerprint: tuple
+    matrix: np.ndarray
+    chunks: list[str]
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes + sum(len(chunk) for chunk in self.chunks)
+
+
+def pdf_fingerprint(pdf_ids: list) -> tuple:
+    return tuple(sorted(set(int(pdf_id) for pdf_id in pdf_ids)))
+
+
+def _to_array(embedding) -> np.ndarray:
+    if isinstance(embedding, Vector):
+        return embedding.to_numpy()
+    if isinstance(embedding, str):
+        return Vector.from_text(embedding).to_numpy()
+    return np.asarray(embedding, dtype=np.float32)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _build_entry(rows, fingerprint: tuple) -> SessionVectors:
+    if rows:
+        matrix = np.stack([_to_array(row.embedding) for row in rows]).astype(np.float32, copy=False)
+        matrix = np.ascontiguousarray(_normalize_rows(matrix))
+    else:
+        matrix = np.empty((0, 0), dtype=np.float32)
+    chunks = [neon_service.format_chunk(row.chunk_text, row.document_metadata) for row in rows]
+    return SessionVectors(fingerprint=fingerprint, matrix=matrix, chunks=chunks)
+
+
+def _rank(entry: SessionVectors, query_embedding: list, top_n: int) -> list[str]:
+    """Top chunks by cosine similarity, matching the `<=>` ordering in Neon."""
+    if not entry.chunks:
+        return []
+    query = np.asarray(query_embedding, dtype=np.float32)
+    norm = np.linalg.norm(query)
+    scores = entry.matrix @ (query / norm if norm else query)
+    if len(scores) > top_n:
+        top = np.argpartition(-scores, top_n)[:top_n]
+        top = top[np.argsort(-scores[top])]
+    else:
+        top = np.argsort(-scores)
+    return [entry.chunks[i] for i in top]
+
+
+class SessionVectorCache:
+    """Keeps the chunk embeddings of each chat session's PDFs in memory.
+
+    Entries are keyed by session and tagged with the PDF set they were loaded
+    for; a turn whose PDF set differs reloads from Neon. Sessions whose PDFs
+    exceed the whole memory budget are searched in Neon instead. An entry
+    expires once its session has had no turn for `ttl` seconds.
+    """
+
+    def __init__(self, max_bytes: int, ttl: Optional[float] = None):
+        self.max_bytes = max_bytes
+        self._entries = LRUCache(max_bytes=max_bytes, ttl=ttl, sizeof=lambda entry: entry.nbytes)
+        self._loading: dict[int, asyncio.Future] = {}
+        # Loads running per session, and a generation bumped when the session is
+        # invalidated meanwhile so they are not stored; both dropped with the last load
+        self._running: dict[int, int] = {}
+        self._generations: dict[int, int] = {}
+        # PDF sets too large to cache, so later turns go straight to Neon
+        self._oversized = LRUCache(max_entries=_MAX_OVERSIZED, ttl=ttl)
+        self.fallbacks = 0
+
+    def invalidate(self, chat_session_id: int):
+        self._entries.pop(chat_session_id)
+        self._oversized.pop(chat_session_id)
+        if chat_session_id in self._running:
+            self._generations[chat_session_id] = self._generations.get(chat_session_id, 0) + 1
+
+    async def _load(self, chat_session_id: int, user_id: int, fingerprint: tuple) -> SessionVectors:
+        self._running[chat_session_id] = self._running.get(chat_session_id, 0) + 1
+        generation = self._generations.get(chat_session_id, 0)
+        try:
+            rows = await neon_service.load_pdf_chunks(user_id, list(fingerprint))
+            entry = await asyncio.to_thread(_build_entry, rows, fingerprint)
+        finally:
+            invalidated = self._generations.get(chat_session_id, 0) != generation
+            self._running[chat_session_id] -= 1
+            if not self._running[chat_session_id]:
+                del self._running[chat_session_id]
+                self._generations.pop(chat_session_id, None)
+        if invalidated:
+            return entry
+        if entry.nbytes > self.max_bytes:
+            self._oversized.set(chat_session_id, fingerprint)
+        else:
+            self._entries.set(chat_session_id, entry)
+            logger.info(
+                f"Cached {len(entry.chunks)} chunk vectors for session {chat_session_id} "
+                f"({entry.nbytes // 1024} KiB)"
+            )
+        return entry
+
+    async def _get_entry(self, chat_session_id: int, user_id: int, fingerprint: tuple) -> SessionVectors:
+        entry = self._entries.get(chat_session_id)
+        if entry is not None and entry.fingerprint == fingerprint:
+            # Expire after `ttl` idle, not `ttl` after loading
+            self._entries.touch(chat_session_id)
+            return entry
+
+        # Concurrent turns in the same session share one load
+        loading = self._loading.get(chat_session_id)
+        if loading is None:
+            loading = asyncio.ensure_future(self._load(chat_session_id, user_id, fingerprint))
+            self._loading[chat_session_id] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(chat_session_id, None))
+        entry = await asyncio.shield(loading)
+        if entry.fingerprint != fingerprint:
+            return await self._load(chat_session_id, user_id, fingerprint)
+        return entry
+
+    async def search(
+        self,
+        chat_session_id: int,
+        user_id: int,
+        pdf_ids: list,
+        query_embedding: list,
+        top_n: int = 5,
+    ) -> list[str]:
+        """Returns the session's most similar PDF chunks, formatted like `search_neon_chunks`."""
+        fingerprint = pdf_fingerprint(pdf_ids)
+        entry = None
+        if self._oversized.get(chat_session_id, count=False) != fingerprint:
+            try:
+                entry = await self._get_entry(chat_session_id, user_id, fingerprint)
+            except Exception as e:
+                logger.error(f"Loading session vectors failed, searching Neon instead: {str(e)}")
+
+        if entry is None or entry.nbytes > self.max_bytes:
+            self.fallbacks += 1
+            return await neon_service.search_neon_chunks(
+                query_embedding=query_embedding, user_id=user_id, pdf_ids=pdf_ids, top_n=top_n
+            )
+        return _rank(entry, query_embedding, top_n)
+
+    def stats(self) -> dict:
+        return {**self._entries.stats(), "neon_fallbacks": self.fallbacks}
+
+
+session_vector_cache = SessionVectorCache(
+    max_bytes=settings.SESSION_VECTOR_CACHE_MAX_BYTES,
+    ttl=settings.SESSION_VECTOR_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,67 @@
+import asyncio
+from typing import AsyncIterator, Optional
+
+import orjson
+
+
+def encode_event(event: dict, event_id: Optional[int] = None) -> bytes:
+    """Encodes one event as a server-sent event frame, ready to write to the response."""
+    frame = b"data: " + orjson.dumps(event) + b"\n\n"
+    if event_id is not None:
+        frame = b"id: %d\n" % event_id + frame
+    return frame
+
+
+async def coalesce(stream: AsyncIterator[str], max_chars: int, max_delay: float) -> AsyncIterator[str]:
+    """Merges text chunks arriving within `max_delay` seconds of the first one.
+
+    A merged chunk is yielded once it reaches `max_chars` or the delay is up,
+    so the client gets fewer, larger frames at a latency cost of at most
+    `max_delay`. With a delay of 0, chunks pass through unchanged.
+    """
+    if max_delay <= 0:
+        async for text in stream:
+            yield text
+        return
+
+    loop = asyncio.get_running_loop()
+    upstream = stream.__aiter__()
+    pending = None
+    parts: list[str] = []
+    size = 0
+    deadline = 0.0
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(upstream.__anext__())
+            if parts:
+                done, _ = await asyncio.wait({pending}, timeout=max(deadline - loop.time(), 0))
+                if not done:
+                    yield "".join(parts)
+                    parts, size = [], 0
+                    continue
+            try:
+                text = await pending
+            except StopAsyncIteration:
+                break
+            finally:
+                if pending.done():
+                    pending = None
+
+            if not parts:
+                deadline = loop.time() + max_delay
+            parts.append(text)
+            size += len(text)
+            if size >= max_chars:
+                yield "".join(parts)
+                parts, size = [], 0
+
+        if parts:
+            yield "".join(parts)
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        aclose = getattr(upstream, "aclose", None)
+        if aclose is not None:
+            await aclose()
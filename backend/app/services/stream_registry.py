@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import secrets
+import uuid
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.services.sse import encode_event
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayUnavailable(Exception):
+    """The events a reconnecting client asked for were already dropped from the buffer."""
+
+
+class ChatStream:
+    """One answer being generated, with its events numbered for replay.
+
+    Keeps the latest events up to `max_bytes`, so a client that reconnects
+    with the id of the last event it saw gets the rest without a new
+    generation. Once no client has followed it for `grace` seconds, the
+    generating task is cancelled. Resuming takes `resume_token`, which only
+    the client that started the stream is sent.
+    """
+
+    def __init__(self, max_bytes: int, grace: float):
+        self.id = uuid.uuid4().hex
+        self.resume_token = secrets.token_urlsafe(24)
+        self.max_bytes = max_bytes
+        self.grace = grace
+        self.done = False
+        self.task: Optional[asyncio.Task] = None
+        self.followers = 0
+        self._abandon_handle: Optional[asyncio.TimerHandle] = None
+        self._frames: deque = deque()
+        self._bytes = 0
+        self._first_id = 1
+        self._next_id = 1
+        self._changed = asyncio.Event()
+
+    def append(self, event: dict):
+        frame = encode_event(event, event_id=self._next_id)
+        self._frames.append(frame)
+        self._bytes += len(frame)
+        self._next_id += 1
+        # Keep the newest frame even if it alone is over the limit
+        while self._bytes > self.max_bytes and len(self._frames) > 1:
+            self._bytes -= len(self._frames.popleft())
+            self._first_id += 1
+        self._notify()
+
+    def finish(self):
+        self.done = True
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def follow(self, last_event_id: int = 0, receive: Optional[Callable[[], Awaitable[dict]]] = None) -> AsyncIterator[bytes]:
+        """Yields the frames after `last_event_id`, then new ones until the stream is done.
+
+        With the ASGI `receive` of the client's request, a watcher task ends
+        the follower as soon as the client disconnects, rather than checking
+        before every frame.
+        """
+        if last_event_id + 1 < self._first_id:
+            raise ReplayUnavailable(f"Events after {last_event_id} of stream {self.id} are gone")
+        return self._follow(last_event_id, receive)
+
+    async def _follow(self, sent: int, receive: Optional[Callable[[], Awaitable[dict]]]) -> AsyncIterator[bytes]:
+        disconnected = False
+
+        async def watch():
+            nonlocal disconnected
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected = True
+            self._notify()
+
+        watcher = asyncio.create_task(watch()) if receive is not None else None
+        self._attach()
+        try:
+            while not disconnected:
+                changed = self._changed
+                if sent + 1 < self._first_id:
+                    # Dropped while this follower was slow; it must reconnect with what it has
+                    return
+                for frame in list(self._frames)[sent + 1 - self._first_id:]:
+                    yield frame
+                sent = self._next_id - 1
+                if self.done:
+                    return
+                await changed.wait()
+            logger.info(f"Client disconnected from stream {self.id} after event {sent}")
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            self._detach()
+
+    def _attach(self):
+        self.followers += 1
+        if self._abandon_handle is not None:
+            self._abandon_handle.cancel()
+            self._abandon_handle = None
+
+    def _detach(self):
+        self.followers -= 1
+        if self.followers == 0 and not self.done:
+            self._abandon_handle = asyncio.get_running_loop().call_later(self.grace, self._abandon)
+
+    def _abandon(self):
+        self._abandon_handle = None
+        if self.followers == 0 and not self.done and self.task is not None:
+            logger.info(f"Cancelling stream {self.id}, not resumed within {self.grace}s")
+            self.task.cancel()
+
+
+class StreamRegistry:
+    """Chat streams by id: running ones, and finished ones for `ttl` seconds.
+
+    Only finished streams count towards `max_streams` and are evicted. A
+    running stream stays resumable until it finishes; running ones are
+    bounded by the deadline and by cancellation once abandoned.
+    """
+
+    def __init__(self, max_streams: int, max_bytes_per_stream: int, ttl: float, grace: float, deadline: float):
+        self.max_bytes_per_stream = max_bytes_per_stream
+        self.ttl = ttl
+        self.grace = grace
+        self.deadline = deadline
+        self._running: dict[str, ChatStream] = {}
+        self._finished = LRUCache(max_entries=max_streams, ttl=ttl)
+        self._tasks: set = set()
+
+    def create(self) -> ChatStream:
+        """A new stream, registered so it can be resumed; `start` runs its events."""
+        stream = ChatStream(self.max_bytes_per_stream, self.grace)
+        self._running[stream.id] = stream
+        return stream
+
+    def start(self, stream: ChatStream, events: AsyncIterator[dict]):
+        """Runs `events` in the background, buffering each one in `stream`."""
+        stream.task = asyncio.create_task(self._produce(stream, events))
+        self._tasks.add(stream.task)
+        stream.task.add_done_callback(self._tasks.discard)
+
+    async def _produce(self, stream: ChatStream, events: AsyncIterator[dict]):
+        async def drain():
+            async for event in events:
+                stream.append(event)
+
+        try:
+            # Cancelling the task, or the deadline passing, unwinds the event
+            # generator from wherever it is waiting, upstream calls included
+            await asyncio.wait_for(drain(), self.deadline)
+        except asyncio.TimeoutError:
+            logger.warning(f"Chat stream {stream.id} cancelled after its {self.deadline}s deadline")
+            # Tell followers it is over, so they don't try to resume it
+            stream.append({"type": "end", "reason": "deadline"})
+        except asyncio.CancelledError:
+            logger.info(f"Chat stream {stream.id} cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Chat stream {stream.id} failed: {str(e)}", exc_info=True)
+            # Terminal, like "end": followers must not try to resume a failed stream
+            stream.append({"type": "error", "detail": "Generating the answer failed. Please try again."})
+        finally:
+            await events.aclose()
+            stream.finish()
+            del self._running[stream.id]
+            self._finished.set(stream.id, stream)
+
+    async def shutdown(self, timeout: Optional[float] = None):
+        """Cancels the streams still generating, e.g. on server shutdown."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+    def get(self, stream_id: str, resume_token: str) -> Optional[ChatStream]:
+        stream = self._running.get(stream_id) or self._finished.get(stream_id)
+        if stream is None or not secrets.compare_digest(stream.resume_token, resume_token):
+            return None
+        return stream
+
+    def stats(self) -> dict:
+        return {**self._finished.stats(), "running": len(self._running)}
+
+
+stream_registry = StreamRegistry(
+    max_streams=settings.STREAM_REPLAY_MAX_STREAMS,
+    max_bytes_per_stream=settings.STREAM_REPLAY_MAX_BYTES,
+    ttl=settings.STREAM_REPLAY_TTL_SECONDS,
+    grace=settings.STREAM_RESUME_GRACE_SECONDS,
+    deadline=settings.STREAM_DEADLINE_SECONDS,
+)
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import weakref
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import lazyload
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import db_models
+from app.services import gemini_service
+from app.services.history_buffer import load_recent_messages
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an assistant.
+Update the summary with the new messages below. Keep names, facts, decisions, open questions
+and anything the user asked to remember; drop pleasantries and code that is no longer relevant.
+Write at most {max_words} words of plain prose.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+# One lock per session, so appends and folds of the same session never interleave
+_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+_fold_tasks: set = set()
+_folding: set[int] = set()
+
+# Backstop for recent_messages if summaries keep failing
+_MAX_RECENT_MESSAGES = 40
+
+
+def _lock(chat_session_id: int) -> asyncio.Lock:
+    lock = _locks.get(chat_session_id)
+    if lock is None:
+        lock = _locks[chat_session_id] = asyncio.Lock()
+    return lock
+
+
+def _format(message: dict) -> str:
+    return f"{message['role']}: {message['content']}"
+
+
+async def migrate_chat_sessions(conn):
+    """Adds the rolling summary columns to existing chat_sessions tables."""
+    await conn.execute(text("ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS summary TEXT"))
+    await conn.execute(text("ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS recent_messages JSONB"))
+
+
+async def _load_recent_rows(db, chat_session_id: int, limit: int) -> list[dict]:
+    """Latest messages of a session that predates recent_messages."""
+    return (await load_recent_messages(db, chat_session_id))[-limit:]
+
+
+async def get_prompt_history(chat_session: db_models.ChatSession) -> tuple[str, list[str]]:
+    """Returns the session's summary and its recent raw messages as "role: content" lines.
+
+    Both come from the session row. Sessions created before the summary
+    columns existed use their latest messages until their next exchange.
+    """
+    recent = chat_session.recent_messages
+    if recent is None:
+        async with AsyncSessionLocal() as db:
+            recent = await _load_recent_rows(db, chat_session.id, settings.SUMMARY_RECENT_MESSAGES)
+    return chat_session.summary or "", [_format(message) for message in recent]
+
+
+async def record_exchange(chat_session_id: int, user_text: str, answer_text: str):
+    """Appends a finished exchange to the session's recent messages.
+
+    Once more messages than SUMMARY_RECENT_MESSAGES have piled up, the oldest
+    are folded into the summary in the background.
+    """
+    async with _lock(chat_session_id):
+        async with AsyncSessionLocal() as db:
+            chat_session = await _get_session(db, chat_session_id)
+            if chat_session is None:
+                return
+            exchange = [
+                {"role": "user", "content": user_text},
+                {"role": "assistant", "content": answer_text},
+            ]
+            if chat_session.recent_messages is None:
+                # Messages are written behind, so the exchange may or may not be stored yet
+                recent = await _load_recent_rows(db, chat_session_id, settings.SUMMARY_RECENT_MESSAGES)
+                if recent[-2:] != exchange:
+                    recent += exchange
+            else:
+                recent = list(chat_session.recent_messages) + exchange
+            if len(recent) > _MAX_RECENT_MESSAGES:
+                logger.warning(f"Dropping unsummarized messages of session {chat_session_id}")
+                recent = recent[-_MAX_RECENT_MESSAGES:]
+            chat_session.recent_messages = recent
+            await db.commit()
+
+    if len(recent) > settings.SUMMARY_RECENT_MESSAGES:
+        task = asyncio.create_task(_fold(chat_session_id))
+        _fold_tasks.add(task)
+        task.add_done_callback(_fold_tasks.discard)
+
+
+async def _get_session(db, chat_session_id: int) -> Optional[db_models.ChatSession]:
+    # Without lazyload, the messages relationship would load every row of the session
+    return await db.get(
+        db_models.ChatSession, chat_session_id, options=[lazyload(db_models.ChatSession.messages)]
+    )
+
+
+async def _fold(chat_session_id: int):
+    """Summarizes the messages that fell out of the recent window into the session summary.
+
+    The lock is only held to read and to write the row, not while Gemini
+    writes the summary, so exchanges in the meantime are not held up.
+    """
+    if chat_session_id in _folding:
+        return
+    _folding.add(chat_session_id)
+    try:
+        async with _lock(chat_session_id):
+            async with AsyncSessionLocal() as db:
+                chat_session = await _get_session(db, chat_session_id)
+                if chat_session is None:
+                    return
+                previous_summary = chat_session.summary
+                overflow = list(chat_session.recent_messages or [])[:-settings.SUMMARY_RECENT_MESSAGES]
+        if not overflow:
+            return
+
+        prompt = SUMMARY_PROMPT.format(
+            max_words=settings.SUMMARY_MAX_WORDS,
+            summary=previous_summary or "(none yet)",
+            messages="\n".join(_format(message) for message in overflow),
+        )
+        summary = await asyncio.wait_for(
+            gemini_service.generate_text(prompt, max_output_tokens=settings.SUMMARY_MAX_WORDS * 2),
+            settings.SUMMARY_TIMEOUT_SECONDS,
+        )
+
+        async with _lock(chat_session_id):
+            async with AsyncSessionLocal() as db:
+                chat_session = await _get_session(db, chat_session_id)
+                recent = list(chat_session.recent_messages or []) if chat_session else []
+                # Exchanges only ever append, so the folded messages are still at the front
+                if recent[:len(overflow)] != overflow:
+                    return
+                chat_session.summary = summary.strip()
+                chat_session.recent_messages = recent[len(overflow):]
+                await db.commit()
+        logger.info(f"Folded {len(overflow)} messages into the summary of session {chat_session_id}")
+    except Exception as e:
+        # The overflow stays in recent_messages and is retried after the next exchange
+        logger.error(f"Updating summary of session {chat_session_id} failed: {str(e)}", exc_info=True)
+    finally:
+        _folding.discard(chat_session_id)
+
+
+async def drain(timeout: Optional[float] = None):
+    """Waits for summary updates that are still running, e.g. on shutdown."""
+    if _fold_tasks:
+        await asyncio.wait(list(_fold_tasks), timeout=timeout)
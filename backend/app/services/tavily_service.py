@@ -1,17 +1,99 @@
-from tavily import TavilyClient
-from fastapi import HTTPException
+import asyncio
+from typing import Optional, Union
+import httpx
+from app.core.cache import LRUCache
 from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
-def fetch_tavily_data(query: str) -> str:
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
+
+# Only these fields are used by the prompt and the sources panel in the UI
+_RESULT_FIELDS = ("title", "url", "content", "score")
+
+_client: Optional[httpx.AsyncClient] = None
+_results = LRUCache(max_entries=settings.TAVILY_CACHE_SIZE, ttl=settings.TAVILY_CACHE_TTL_SECONDS)
+_inflight: dict[str, asyncio.Future] = {}
+# Callers still waiting on each in-flight search, by search rather than by
+# query, so a finished search never touches the count of a newer one
+_waiters: dict[asyncio.Future, int] = {}
+
+def _get_client() -> httpx.AsyncClient:
+    """Returns the shared keep-alive client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {settings.TAVILY_API_KEY}"},
+            timeout=httpx.Timeout(settings.TAVILY_TIMEOUT_SECONDS, connect=settings.TAVILY_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=settings.TAVILY_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.TAVILY_MAX_CONNECTIONS,
+                keepalive_expiry=60
+            ),
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+def _trim(response: dict) -> dict:
+    """Drops everything from a Tavily response except what the prompt and UI use."""
+    return {
+        "query": response.get("query"),
+        "results": [
+            {field: result.get(field) for field in _RESULT_FIELDS}
+            for result in response.get("results") or []
+        ],
+    }
+
+async def _search(query: str) -> dict:
+    response = await _get_client().post(TAVILY_SEARCH_URL, json={"query": query, "include_images": False})
+    response.raise_for_status()
+    return _trim(response.json())
+
+def _finish_search(key: str, search: asyncio.Future):
+    if _inflight.get(key) is search:
+        del _inflight[key]
+    _waiters.pop(search, None)
+    if not search.cancelled():
+        search.exception()  # Mark as retrieved even if every waiter went away
+
+async def fetch_tavily_data(query: str) -> Union[dict, str]:
     """Fetch extra topical information from Tavilly."""
+    key = normalize_query(query)
+    cached = _results.get(key)
+    if cached is not None:
+        return cached
+
+    # Identical questions asked at the same time share one request
+    search = _inflight.get(key)
+    if search is None:
+        search = asyncio.ensure_future(_search(query))
+        _inflight[key] = search
+        search.add_done_callback(lambda done: _finish_search(key, done))
+    _waiters[search] = _waiters.get(search, 0) + 1
     try:
-        client = TavilyClient(api_key=settings.TAVILY_API_KEY)
-        response = client.search(query=query, include_images=False)
-        print(response)
-        return response
+        result = await asyncio.shield(search)
+    except asyncio.CancelledError:
+        # Abort the request once nobody is waiting for it anymore
+        if _waiters.get(search) == 1 and not search.done():
+            search.cancel()
+        raise
     except Exception as e:
         logger.error(f"Error fetching Tavily data: {e}", exc_info=True)
-        return ""
\ No newline at end of file
+        return ""
+    finally:
+        if search in _waiters:
+            _waiters[search] -= 1
+    _results.set(key, result)
+    return result
+
+def get_cache_stats() -> dict:
+    return _results.stats()
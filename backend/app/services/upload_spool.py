@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b"%PDF"
+
+# Allowance for multipart boundaries and part headers around the file itself
+_MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+@dataclass
+class SpooledUpload:
+    """An uploaded file written to a temporary file on disk."""
+    path: str
+    filename: str
+    size: int
+
+    def remove(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _write_pieces(file, pieces: list[bytes]):
+    for piece in pieces:
+        file.write(piece)
+
+
+class _PDFPartReceiver:
+    """python-multipart callbacks that route one file field into a temp file."""
+
+    def __init__(self, field_name: str, max_bytes: int):
+        self.field_name = field_name
+        self.max_bytes = max_bytes
+        self.file = None
+        self.filename: Optional[str] = None
+        self.size = 0
+        self.pending: list[bytes] = []
+        self._head = b""
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._in_file = False
+
+    def on_part_begin(self):
+        self._disposition = b""
+        self._in_file = False
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if options.get(b"name", b"").decode("latin-1") != self.field_name or b"filename" not in options:
+            return
+        if self.file is not None:
+            raise HTTPException(status_code=400, detail="Only one file can be uploaded at a time")
+
+        filename = options[b"filename"].decode("utf-8", errors="replace")
+        if not filename:
+            raise HTTPException(status_code=400, detail="No filename provided")
+        if not filename.lower().endswith('.pdf'):
+            raise HTTPException(status_code=400, detail="Only PDF files are supported")
+
+        self.filename = filename
+        self.file = tempfile.NamedTemporaryFile(suffix=".pdf", dir=settings.PDF_UPLOAD_DIR, delete=False)
+        self._in_file = True
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if not self._in_file:
+            return
+        piece = data[start:end]
+        self.size += len(piece)
+        if self.size > self.max_bytes:
+            raise HTTPException(status_code=400, detail=f"File too large (max {self.max_bytes // (1024 * 1024)}MB)")
+        if len(self._head) < len(PDF_MAGIC):
+            self._head += piece[:len(PDF_MAGIC) - len(self._head)]
+            if len(self._head) == len(PDF_MAGIC) and self._head != PDF_MAGIC:
+                raise HTTPException(status_code=400, detail="Invalid PDF format")
+        self.pending.append(piece)
+
+    def on_part_end(self):
+        self._in_file = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+
+async def receive_pdf_upload(request: Request, field_name: str = "file") -> SpooledUpload:
+    """Streams a multipart PDF upload to a temporary file.
+
+    The size limit and the %PDF magic bytes are enforced while the body is
+    still arriving, so oversized or non-PDF uploads are rejected without being
+    buffered. The caller owns the returned file and must `remove()` it.
+    """
+    max_bytes = settings.PDF_MAX_UPLOAD_BYTES
+
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + _MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(status_code=400, detail=f"File too large (max {max_bytes // (1024 * 1024)}MB)")
+
+    receiver = _PDFPartReceiver(field_name, max_bytes)
+    parser = MultipartParser(params[b"boundary"], receiver.callbacks())
+    try:
+        async for block in request.stream():
+            parser.write(block)
+            if receiver.pending:
+                pieces, receiver.pending = receiver.pending, []
+                await asyncio.to_thread(_write_pieces, receiver.file, pieces)
+        parser.finalize()
+
+        if receiver.file is None:
+            raise HTTPException(status_code=400, detail="No file provided")
+        if receiver.size < len(PDF_MAGIC):
+            raise HTTPException(status_code=400, detail="Invalid PDF format")
+        receiver.file.close()
+        return SpooledUpload(path=receiver.file.name, filename=receiver.filename, size=receiver.size)
+    except BaseException:
+        if receiver.file is not None:
+            receiver.file.close()
+            os.unlink(receiver.file.name)
+        raise
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import neon_engine
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("hnsw", "ivfflat")
+INDEX_NAMES = {index_type: f"ix_document_chunks_embedding_{index_type}" for index_type in INDEX_TYPES}
+
+_build_state = {"status": "pending", "started_at": None, "finished_at": None, "error": None}
+_build_task: Optional[asyncio.Task] = None
+# Iterative index scans need pgvector >= 0.8; unknown until the extension version is read
+_iterative_scan_supported: Optional[bool] = None
+
+
+def _index_type() -> Optional[str]:
+    index_type = settings.VECTOR_INDEX_TYPE
+    return index_type if index_type in INDEX_TYPES else None
+
+
+def index_definition(index_type: str) -> str:
+    """CREATE INDEX statement for the configured ANN index, using the cosine opclass to match `<=>`."""
+    if index_type == "hnsw":
+        options = f"m = {settings.HNSW_M}, ef_construction = {settings.HNSW_EF_CONSTRUCTION}"
+    else:
+        options = f"lists = {settings.IVFFLAT_LISTS}"
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAMES[index_type]} "
+        f"ON document_chunks USING {index_type} (embedding vector_cosine_ops) WITH ({options})"
+    )
+
+
+def search_settings(ef_search: Optional[int] = None, probes: Optional[int] = None, filtered: bool = False) -> dict[str, str]:
+    """Transaction-local planner settings for a similarity search against the current index.
+
+    Filters are applied to the candidates the index returns, so `filtered`
+    searches take more of them and, on pgvector >= 0.8, keep scanning until
+    enough rows pass the filter.
+    """
+    index_type = _index_type()
+    iterative_scan = settings.VECTOR_ITERATIVE_SCAN if filtered and _iterative_scan_supported else ""
+    if index_type == "hnsw":
+        default = settings.HNSW_FILTERED_EF_SEARCH if filtered else settings.HNSW_EF_SEARCH
+        values = {"hnsw.ef_search": str(ef_search or default)}
+        if iterative_scan:
+            values["hnsw.iterative_scan"] = iterative_scan
+        return values
+    if index_type == "ivfflat":
+        default = settings.IVFFLAT_FILTERED_PROBES if filtered else settings.IVFFLAT_PROBES
+        values = {"ivfflat.probes": str(probes or default)}
+        if iterative_scan:
+            values["ivfflat.iterative_scan"] = iterative_scan
+        return values
+    return {}
+
+
+async def apply_search_settings(neon_db, ef_search: Optional[int] = None, probes: Optional[int] = None, filtered: bool = False):
+    """Applies `search_settings` to the session's current transaction in one round trip."""
+    values = search_settings(ef_search, probes, filtered)
+    if not values:
+        return
+    params = {}
+    calls = []
+    for i, (name, value) in enumerate(values.items()):
+        params[f"name_{i}"], params[f"value_{i}"] = name, value
+        calls.append(f"set_config(:name_{i}, :value_{i}, true)")
+    await neon_db.execute(text(f"SELECT {', '.join(calls)}"), params)
+
+
+def _parse_version(version: Optional[str]) -> tuple:
+    try:
+        return tuple(int(part) for part in (version or "0").split(".")[:2])
+    except ValueError:
+        return (0,)
+
+
+async def _fetch_index(conn, name: str) -> Optional[dict]:
+    result = await conn.execute(text("""
+        SELECT i.indisvalid AS valid, pg_relation_size(i.indexrelid) AS size_bytes
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :name
+    """), {"name": name})
+    row = result.mappings().first()
+    return dict(row) if row else None
+
+
+async def ensure_vector_index(rebuild: bool = False):
+    """Creates the configured ANN index if it is missing or invalid.
+
+    Builds run CONCURRENTLY so searches and ingestion keep working. An index of
+    the other type is dropped once the configured one is ready.
+    """
+    global _iterative_scan_supported
+    index_type = _index_type()
+    if index_type is None:
+        _build_state.update(status="disabled")
+        return
+
+    name = INDEX_NAMES[index_type]
+    _build_state.update(status="building", started_at=time.time(), finished_at=None, error=None)
+    try:
+        async with neon_engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            version = await conn.scalar(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'"))
+            _iterative_scan_supported = _parse_version(version) >= (0, 8)
+            if settings.VECTOR_ITERATIVE_SCAN and not _iterative_scan_supported:
+                logger.warning(
+                    f"pgvector {version} has no iterative index scans; "
+                    f"filtered searches rely on HNSW_FILTERED_EF_SEARCH/IVFFLAT_FILTERED_PROBES alone"
+                )
+            existing = await _fetch_index(conn, name)
+            if existing and (rebuild or not existing["valid"]):
+                # A failed concurrent build leaves an invalid index behind
+                logger.info(f"Dropping vector index {name} for rebuild")
+                await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                existing = None
+
+            if not existing:
+                logger.info(f"Building vector index {name}")
+                if settings.VECTOR_INDEX_MAINTENANCE_WORK_MEM:
+                    await conn.execute(text(f"SET maintenance_work_mem = '{settings.VECTOR_INDEX_MAINTENANCE_WORK_MEM}'"))
+                await conn.execute(text(index_definition(index_type)))
+
+            for other_type, other_name in INDEX_NAMES.items():
+                if other_type != index_type:
+                    await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {other_name}"))
+
+        _build_state.update(status="ready", finished_at=time.time())
+        logger.info(f"Vector index {name} is ready")
+    except Exception as e:
+        _build_state.update(status="failed", finished_at=time.time(), error=str(e))
+        logger.error(f"Building vector index {name} failed: {str(e)}", exc_info=True)
+
+
+def start_index_build(rebuild: bool = False) -> bool:
+    """Starts `ensure_vector_index` in the background unless a build is already running."""
+    global _build_task
+    if _build_task is not None and not _build_task.done():
+        return False
+    _build_task = asyncio.create_task(ensure_vector_index(rebuild=rebuild))
+    return True
+
+
+async def stop_index_build():
+    if _build_task is not None and not _build_task.done():
+        _build_task.cancel()
+        try:
+            await _build_task
+        except asyncio.CancelledError:
+            pass
+
+
+async def get_index_status() -> dict:
+    """Reports the configured index, its size on disk and the progress of a running build."""
+    index_type = _index_type()
+    status = {
+        "type": index_type,
+        "name": INDEX_NAMES.get(index_type),
+        "search_settings": search_settings(filtered=True),
+        "iterative_scan_supported": _iterative_scan_supported,
+        "build": dict(_build_state),
+    }
+    if index_type is None:
+        return status
+
+    async with neon_engine.connect() as conn:
+        status["index"] = await _fetch_index(conn, INDEX_NAMES[index_type])
+        result = await conn.execute(text("""
+            SELECT p.phase, p.blocks_done, p.blocks_total, p.tuples_done, p.tuples_total
+            FROM pg_stat_progress_create_index p
+            JOIN pg_class c ON c.oid = p.relid
+            WHERE c.relname = 'document_chunks'
+        """))
+        progress = result.mappings().first()
+        status["progress"] = dict(progress) if progress else None
+        result = await conn.execute(text("SELECT count(*) FROM document_chunks"))
+        status["row_count"] = result.scalar()
+    return status
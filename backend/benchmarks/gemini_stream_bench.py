@@ -0,0 +1,126 @@
+"""Time-to-first-token, throughput and event loop lag of Gemini streaming.
+
+Swaps `gemini_service.model` for a fake model that emits chunks at a fixed
+pace, so no API key or network is needed. It compares the async streaming
+path with the previous one, which iterated the blocking SDK stream inside
+the event loop and slept 10 ms per chunk. Run from the backend directory:
+
+    python -m benchmarks.gemini_stream_bench --streams 20 --chunks 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.services import gemini_service
+
+
+class _FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _AsyncFakeStream:
+    def __init__(self, chunks: int, first_delay: float, interval: float):
+        self.chunks = chunks
+        self.first_delay = first_delay
+        self.interval = interval
+
+    async def __aiter__(self):
+        await asyncio.sleep(self.first_delay)
+        for i in range(self.chunks):
+            if i:
+                await asyncio.sleep(self.interval)
+            yield _FakeChunk(f"token{i} ")
+
+
+class _SyncFakeStream(_AsyncFakeStream):
+    def __iter__(self):
+        time.sleep(self.first_delay)
+        for i in range(self.chunks):
+            if i:
+                time.sleep(self.interval)
+            yield _FakeChunk(f"token{i} ")
+
+
+class FakeModel:
+    """Stands in for `genai.GenerativeModel`, pacing chunks like a remote model."""
+
+    def __init__(self, chunks: int, first_delay: float, interval: float):
+        self.args = (chunks, first_delay, interval)
+
+    async def generate_content_async(self, prompt, stream=False, generation_config=None):
+        return _AsyncFakeStream(*self.args)
+
+    def generate_content(self, prompt, stream=False, generation_config=None):
+        return _SyncFakeStream(*self.args)
+
+
+def _legacy_streaming(prompt: str):
+    """The blocking implementation this benchmark is measured against."""
+    response_stream = gemini_service.model.generate_content(prompt, stream=True)
+
+    async def text_streamer():
+        for chunk in response_stream:
+            if chunk.text:
+                yield f"data: {json.dumps({'type': 'answer_chunk', 'text': chunk.text})}\n\n"
+            await asyncio.sleep(0.01)
+    return text_streamer()
+
+
+async def _consume(stream_factory, prompt: str) -> dict:
+    started = time.perf_counter()
+    first = None
+    count = 0
+    async for _ in stream_factory(prompt):
+        if first is None:
+            first = time.perf_counter() - started
+        count += 1
+    return {"ttft": first, "total": time.perf_counter() - started, "chunks": count}
+
+
+async def _loop_lag(stop: asyncio.Event, samples: list):
+    """Measures how late a 5 ms timer fires, i.e. how long the loop was blocked."""
+    while not stop.is_set():
+        expected = time.perf_counter() + 0.005
+        await asyncio.sleep(0.005)
+        samples.append(max(time.perf_counter() - expected, 0))
+
+
+async def _run(name: str, stream_factory, streams: int):
+    stop = asyncio.Event()
+    lag: list = []
+    lag_task = asyncio.create_task(_loop_lag(stop, lag))
+    started = time.perf_counter()
+    results = await asyncio.gather(*[_consume(stream_factory, f"prompt {i}") for i in range(streams)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+
+    ttfts = sorted(r["ttft"] * 1000 for r in results)
+    chunks = sum(r["chunks"] for r in results)
+    print(
+        f"{name:>8}: ttft p50 {statistics.median(ttfts):8.1f} ms  max {ttfts[-1]:8.1f} ms  "
+        f"{chunks / elapsed:8.1f} chunks/s  wall {elapsed:6.2f} s  "
+        f"loop lag max {max(lag, default=0) * 1000:7.1f} ms"
+    )
+
+
+async def main(args):
+    gemini_service.model = FakeModel(args.chunks, args.first_delay_ms / 1000, args.interval_ms / 1000)
+    print(f"{args.streams} concurrent streams x {args.chunks} chunks, "
+          f"first chunk after {args.first_delay_ms} ms, then every {args.interval_ms} ms")
+    await _run("async", gemini_service.generate_response_with_gemini_streaming, args.streams)
+    if not args.skip_legacy:
+        await _run("legacy", _legacy_streaming, args.streams)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=10)
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--first-delay-ms", type=float, default=300)
+    parser.add_argument("--interval-ms", type=float, default=20)
+    parser.add_argument("--skip-legacy", action="store_true", help="Only run the async path")
+    asyncio.run(main(parser.parse_args()))
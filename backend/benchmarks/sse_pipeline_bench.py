@@ -0,0 +1,77 @@
+"""CPU per chunk and frames per answer of the SSE answer pipeline.
+
+Compares the previous pipeline, where the model layer produced SSE strings
+that the chat handler parsed and re-encoded with `json` while concatenating
+the answer, with plain text chunks encoded once by `sse.encode_event`. A
+second run feeds a paced stream of small chunks through `sse.coalesce` to
+count the frames it saves. Run from the backend directory:
+
+    python -m benchmarks.sse_pipeline_bench --chunks 2000 --interval-ms 2
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.services.sse import coalesce, encode_event
+
+
+def _chunks(count: int) -> list[str]:
+    return [f"token{i} with some \"quoted\" text\n" for i in range(count)]
+
+
+def _legacy(chunks: list[str]) -> str:
+    full_answer = ""
+    for text in chunks:
+        frame = f"data: {json.dumps({'type': 'answer_chunk', 'text': text})}\n\n"
+        chunk_text = json.loads(frame.removeprefix("data: ").removesuffix("\n\n")).get("text", "")
+        full_answer += chunk_text
+        f"data: {json.dumps({'type': 'content', 'text': chunk_text})}\n\n".encode()
+    return full_answer
+
+
+def _current(chunks: list[str]) -> str:
+    parts = []
+    for text in chunks:
+        parts.append(text)
+        encode_event({"type": "content", "text": text})
+    return "".join(parts)
+
+
+def _time_per_chunk(fn, chunks: list[str], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(chunks)
+    return (time.perf_counter() - started) / (repeat * len(chunks))
+
+
+async def _paced(chunks: list[str], interval: float):
+    for text in chunks:
+        await asyncio.sleep(interval)
+        yield text
+
+
+async def _frames(chunks: list[str], interval: float, window_ms: float, max_chars: int) -> int:
+    return len([text async for text in coalesce(_paced(chunks, interval), max_chars, window_ms / 1000)])
+
+
+def main(args):
+    chunks = _chunks(args.chunks)
+    legacy = _time_per_chunk(_legacy, chunks, args.repeat)
+    current = _time_per_chunk(_current, chunks, args.repeat)
+    print(f"per chunk: legacy {legacy * 1e6:6.2f} us  current {current * 1e6:6.2f} us  ({legacy / current:.1f}x)")
+
+    paced = chunks[:args.paced_chunks]
+    for window_ms in (0, 5, 15, 50):
+        frames = asyncio.run(_frames(paced, args.interval_ms / 1000, window_ms, args.max_chars))
+        print(f"coalesce {window_ms:>3} ms: {len(paced)} chunks -> {frames} frames")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--paced-chunks", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=2)
+    parser.add_argument("--max-chars", type=int, default=512)
+    main(parser.parse_args())
@@ -0,0 +1,4 @@
+import os
+
+# app.core.database builds its engine URLs at import; no connection is made
+os.environ.setdefault("SUPABASE_DB_PORT", "5432")
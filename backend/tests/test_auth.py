@@ -0,0 +1,45 @@
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+from app.api import auth
+from app.models import db_models
+
+TOKEN = "header.payload.signature"
+
+
+class FakeDB:
+    """Answers the users lookup of `_resolve_user` with whatever row is set."""
+
+    def __init__(self, row):
+        self.row = row
+        self.queries = 0
+
+    async def execute(self, stmt):
+        self.queries += 1
+        return SimpleNamespace(scalar_one_or_none=lambda: self.row)
+
+
+def _user(username: str) -> db_models.User:
+    return db_models.User(id=1, clerk_user_id="user_abc", username=username, email="a@example.com")
+
+
+def test_invalidate_user_evicts_cached_identity():
+    token_key = hashlib.sha256(TOKEN.encode("utf-8")).digest()
+    auth._token_cache.set(token_key, ("user_abc", "a@example.com"), ttl=60)
+    db = FakeDB(_user("before"))
+    try:
+        first = asyncio.run(auth._resolve_user(f"Bearer {TOKEN}", db))
+        db.row = _user("after")
+        # Served from the user cache, so the changed row is not seen yet
+        assert asyncio.run(auth._resolve_user(f"Bearer {TOKEN}", db)) == first
+        assert db.queries == 1
+
+        auth.invalidate_user("user_abc")
+
+        assert "user_abc" not in auth._user_cache
+        assert asyncio.run(auth._resolve_user(f"Bearer {TOKEN}", db)).username == "after"
+        assert db.queries == 2
+    finally:
+        auth._token_cache.clear()
+        auth._user_cache.clear()
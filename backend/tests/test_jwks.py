@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.api import auth
+from app.core.jwks import JWKSStore
+
+
+class FailingStore(JWKSStore):
+    """A store whose fetches fail as if Clerk were down, optionally with keys already loaded."""
+
+    def __init__(self, keys: dict):
+        super().__init__(url="https://clerk.invalid/jwks", ttl=3600, min_refetch_interval=0, timeout=1)
+        self._keys = dict(keys)
+        # Keys loaded just now are fresh, so only the unknown-kid refetch fetches
+        self._fetched_at = time.monotonic() if keys else 0.0
+        self.fetches = 0
+
+    async def _fetch(self):
+        self.fetches += 1
+        raise httpx.ConnectError("connection refused")
+
+
+def _get_public_key(store: JWKSStore, kid: str, monkeypatch):
+    monkeypatch.setattr(auth, "jwks_store", store)
+    return asyncio.run(auth.get_public_key(kid))
+
+
+def test_failed_refetch_for_unknown_kid_is_401(monkeypatch):
+    store = FailingStore({"known": object()})
+    with pytest.raises(HTTPException) as raised:
+        _get_public_key(store, "rotated", monkeypatch)
+    assert raised.value.status_code == 401
+    assert store.fetches == 1
+
+
+def test_failed_fetch_without_cached_keys_is_503(monkeypatch):
+    store = FailingStore({})
+    with pytest.raises(HTTPException) as raised:
+        _get_public_key(store, "any", monkeypatch)
+    assert raised.value.status_code == 503
+    assert "Retry-After" in raised.value.headers
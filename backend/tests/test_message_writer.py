@@ -0,0 +1,64 @@
+import asyncio
+
+from sqlalchemy.dialects import postgresql
+
+from app.services import message_writer as writer_module
+from app.services.message_writer import MessageWriter, _AppendLog, message_row
+
+
+class FakeTable:
+    """chat_messages with its unique client_id index, honouring ON CONFLICT DO NOTHING."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def session(self):
+        return FakeSession(self)
+
+
+class FakeSession:
+    def __init__(self, table: FakeTable):
+        self.table = table
+        self.staged = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, stmt, rows):
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (client_id) DO NOTHING" in sql
+        self.staged.extend(rows)
+
+    async def commit(self):
+        for row in self.staged:
+            self.table.rows.setdefault(row["client_id"], row)
+
+
+def test_replaying_a_committed_batch_does_not_duplicate_messages(tmp_path, monkeypatch):
+    table = FakeTable()
+    monkeypatch.setattr(writer_module, "AsyncSessionLocal", table.session)
+    log_path = str(tmp_path / "messages.log")
+    rows = [message_row(1, 1, "question", True), message_row(1, None, "answer", False)]
+
+    async def crash_after_commit():
+        writer = MessageWriter(max_queued=10, batch_size=10, flush_interval=0.01, log=_AppendLog(log_path, fsync=False))
+        writer.log.open()
+        await writer.submit(rows)
+        # Committed, but the process dies before the "done" record is written
+        await writer._insert(rows)
+        writer.log.close()
+
+    async def restart():
+        writer = MessageWriter(max_queued=10, batch_size=10, flush_interval=0.01, log=_AppendLog(log_path, fsync=False))
+        await writer.start()
+        await writer.flush(timeout=5)
+        await writer.stop(timeout=5)
+
+    asyncio.run(crash_after_commit())
+    asyncio.run(restart())
+
+    assert sorted(row["content"] for row in table.rows.values()) == ["answer", "question"]
+    assert set(table.rows) == {row["client_id"] for row in rows}
@@ -0,0 +1,53 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.services.rate_limiter import RateLimiterUnavailable, SQLiteRateLimiter
+
+
+def test_sqlite_limiter_enforces_limit(tmp_path):
+    limiter = SQLiteRateLimiter(limit=3, window=60, path=str(tmp_path / "limits.sqlite3"), busy=0.5)
+
+    async def hits():
+        return [(await limiter.hit("visitor")).allowed for _ in range(4)]
+
+    try:
+        assert asyncio.run(hits()) == [True, True, True, False]
+    finally:
+        limiter.close()
+
+
+def test_sqlite_limiter_refuses_when_locked_without_blocking_the_loop(tmp_path):
+    path = str(tmp_path / "limits.sqlite3")
+    limiter = SQLiteRateLimiter(limit=3, window=60, path=path, busy=0.1)
+    # Another worker holding the write lock for longer than both attempts wait
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("CREATE TABLE IF NOT EXISTS rate_limit_buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+    other.execute("BEGIN IMMEDIATE")
+
+    async def hit_while_ticking():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        try:
+            with pytest.raises(RateLimiterUnavailable):
+                await limiter.hit("visitor")
+        finally:
+            ticker.cancel()
+        return ticks
+
+    try:
+        # The loop kept running while the hit waited out the lock twice
+        assert asyncio.run(hit_while_ticking()) >= 5
+        assert limiter.unavailable == 1
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+        limiter.close()
@@ -0,0 +1,31 @@
+import asyncio
+
+from app.services.stream_registry import StreamRegistry
+
+
+def test_running_streams_are_not_evicted_past_the_cap():
+    async def scenario():
+        registry = StreamRegistry(max_streams=2, max_bytes_per_stream=1024, ttl=60, grace=30, deadline=60)
+        release = asyncio.Event()
+
+        async def events():
+            yield {"type": "content", "text": "partial"}
+            await release.wait()
+            yield {"type": "end"}
+
+        streams = [registry.create() for _ in range(4)]
+        for stream in streams:
+            registry.start(stream, events())
+        await asyncio.sleep(0)
+
+        # More streams running than max_streams: all of them can still be resumed
+        assert all(registry.get(s.id, s.resume_token) is s for s in streams)
+        assert registry.stats()["running"] == 4
+
+        release.set()
+        await registry.shutdown(timeout=5)
+        # Once finished, only the latest max_streams are kept
+        kept = [s for s in streams if registry.get(s.id, s.resume_token) is not None]
+        assert len(kept) == 2 and registry.stats()["running"] == 0
+
+    asyncio.run(scenario())
@@ -83,13 +83,25 @@ export function PDFUploader({ sessionId }: PDFUploaderProps) {
     setUploadProgress(0);
 
     try {
-      // Simulate upload progress
-      const progressInterval = setInterval(() => {
-        setUploadProgress((prev) => Math.min(prev + 10, 90));
-      }, 500);
+      // Upload the file, then follow the background ingestion job
+      const { data: job } = await pdfApi.uploadPdf(file);
+      setUploadProgress(10);
 
-      const { data } = await pdfApi.uploadPdf(file);
-      clearInterval(progressInterval);
+      const data = await pdfApi.waitForUploadJob(job.job_id, (status) => {
+        const { pages_done, page_count, chunks_embedded, chunk_count } =
+          status.progress || {};
+        if (status.status === "extracting" && page_count) {
+          setUploadProgress(
+            10 + Math.round((40 * (pages_done || 0)) / page_count)
+          );
+        } else if (status.status === "embedding" && chunk_count) {
+          setUploadProgress(
+            50 + Math.round((40 * (chunks_embedded || 0)) / chunk_count)
+          );
+        } else if (status.status === "storing") {
+          setUploadProgress(95);
+        }
+      });
       setUploadProgress(100);
 
       if (!data || !data.id) {
@@ -97,7 +109,11 @@ export function PDFUploader({ sessionId }: PDFUploaderProps) {
       }
 
       setUploadedPdfs((prev) => [...prev, data]);
-      toast("PDF uploaded successfully");
+      toast(
+        data.warning
+          ? `PDF saved, but it can't be searched yet: ${data.warning}`
+          : "PDF uploaded successfully"
+      );
 
       // If session ID is provided, automatically attach the PDF to session
       if (sessionId) {
@@ -142,6 +158,7 @@ export function PDFUploader({ sessionId }: PDFUploaderProps) {
       console.error("Failed to upload PDF:", error);
       const errorMessage =
         error?.response?.data?.detail ||
+        error?.message ||
         "There was an error uploading your PDF.";
       setError(errorMessage);
       toast(errorMessage);
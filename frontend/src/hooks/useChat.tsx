@@ -172,7 +172,7 @@ export function useChat(initialSessionId?: number) {
         }
 
         // Use fetch to send request with streaming
-        const response = await fetch(
+        let response = await fetch(
           `https://perplexia.onrender.com/chat/stream`,
           {
             method: "POST",
@@ -189,77 +189,147 @@ export function useChat(initialSessionId?: number) {
           }
         );
 
-        // Process the streaming response
-        const reader = response.body?.getReader();
-        let buffer = "";
-
-        if (reader) {
-          while (true) {
-            const { done, value } = await reader.read();
-            if (done) break;
-
-            // Decode chunk and add to buffer
-            const chunk = new TextDecoder().decode(value);
-            buffer += chunk;
-
-            // Process complete SSE messages
-            const lines = buffer.split("\n\n");
-            buffer = lines.pop() || "";
-
-            for (const line of lines) {
-              if (!line.trim() || !line.startsWith("data: ")) continue;
-
-              try {
-                const data = JSON.parse(line.substring(6)); // Remove "data: " prefix
-
-                if (data.type === "metadata") {
-                  const newSessionId = data.data.chat_session_id;
-
-                  if (data.data.search) {
-                    let parsedSearchData;
-                    try {
-                      parsedSearchData =
-                        typeof data.data.search === "string"
-                          ? JSON.parse(data.data.search)
-                          : data.data.search;
-                    } catch (e) {
-                      console.error("Failed to parse search data:", e);
-                      parsedSearchData = { results: [] }; // Fallback
+        // Process the streaming response, resuming it from the last event
+        // seen if the connection drops before the end
+        let streamId: string | undefined;
+        let resumeToken: string | undefined;
+        let lastEventId = 0;
+        let finished = false;
+        let resumeAttempts = 0;
+        while (true) {
+          const reader = response.body?.getReader();
+          let buffer = "";
+
+          if (reader) {
+            try {
+              while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+
+                // Decode chunk and add to buffer
+                const chunk = new TextDecoder().decode(value);
+                buffer += chunk;
+
+                // Process complete SSE messages
+                const lines = buffer.split("\n\n");
+                buffer = lines.pop() || "";
+
+                for (const line of lines) {
+                  // Frames are numbered with an "id:" line before their data
+                  let payload = "";
+                  for (const field of line.split("\n")) {
+                    if (field.startsWith("id: ")) {
+                      lastEventId = Number(field.substring(4));
+                    } else if (field.startsWith("data: ")) {
+                      payload = field.substring(6);
                     }
-
-                    setMessages((prev) =>
-                      prev.map((msg) =>
-                        msg.id === assistantMessage.id
-                          ? { ...msg, searchData: parsedSearchData }
-                          : msg
-                      )
-                    );
                   }
-
-                  if (!sessionId && newSessionId) {
-                    // Update our internal state
-                    setSessionId(newSessionId);
-                    // Navigate to the new session
-                    handleNavigation(`/chat/${newSessionId}`);
+                  if (!payload) continue;
+
+                  try {
+                    const data = JSON.parse(payload);
+
+                    if (data.type === "metadata") {
+                      const newSessionId = data.data.chat_session_id;
+                      streamId = data.data.stream_id;
+                      resumeToken = data.data.resume_token;
+
+                      if (data.data.search) {
+                        let parsedSearchData;
+                        try {
+                          parsedSearchData =
+                            typeof data.data.search === "string"
+                              ? JSON.parse(data.data.search)
+                              : data.data.search;
+                        } catch (e) {
+                          console.error("Failed to parse search data:", e);
+                          parsedSearchData = { results: [] }; // Fallback
+                        }
+
+                        setMessages((prev) =>
+                          prev.map((msg) =>
+                            msg.id === assistantMessage.id
+                              ? { ...msg, searchData: parsedSearchData }
+                              : msg
+                          )
+                        );
+                      }
+
+                      if (!sessionId && newSessionId) {
+                        // Update our internal state
+                        setSessionId(newSessionId);
+                        // Navigate to the new session
+                        handleNavigation(`/chat/${newSessionId}`);
+                      }
+                    } else if (data.type === "sources") {
+                      // Web results arrive before the answer; render them right away
+                      if (data.source === "web" && data.data) {
+                        const searchData =
+                          typeof data.data === "string" ? { results: [] } : data.data;
+                        setMessages((prev) =>
+                          prev.map((msg) =>
+                            msg.id === assistantMessage.id
+                              ? { ...msg, searchData }
+                              : msg
+                          )
+                        );
+                      }
+                    } else if (data.type === "content") {
+                      // Update assistant message with new content
+                      setMessages((prev) =>
+                        prev.map((msg) =>
+                          msg.id === assistantMessage.id
+                            ? { ...msg, content: msg.content + data.text }
+                            : msg
+                        )
+                      );
+                    } else if (data.type === "end") {
+                      // Message streaming completed
+                      finished = true;
+                      fetchSessions();
+                    } else if (data.type === "error") {
+                      // Generation failed on the server; resuming won't help
+                      finished = true;
+                      setMessages((prev) =>
+                        prev.map((msg) =>
+                          msg.id === assistantMessage.id
+                            ? {
+                                ...msg,
+                                content:
+                                  (msg.content ? msg.content + "\n\n" : "") +
+                                  `_${data.detail}_`,
+                              }
+                            : msg
+                        )
+                      );
+                    }
+                  } catch (error) {
+                    console.error("Error parsing SSE message:", error);
                   }
-                } else if (data.type === "content") {
-                  // Update assistant message with new content
-                  setMessages((prev) =>
-                    prev.map((msg) =>
-                      msg.id === assistantMessage.id
-                        ? { ...msg, content: msg.content + data.text }
-                        : msg
-                    )
-                  );
-                } else if (data.type === "end") {
-                  // Message streaming completed
-                  fetchSessions();
                 }
-              } catch (error) {
-                console.error("Error parsing SSE message:", error);
               }
+            } catch (error) {
+              // A dropped connection is resumed below; aborts end the message
+              if (error instanceof Error && error.name === "AbortError") throw error;
+              console.error("Stream interrupted:", error);
             }
           }
+          if (finished || !streamId || !resumeToken || resumeAttempts >= 3) break;
+          resumeAttempts += 1;
+          await new Promise((resolve) => setTimeout(resolve, 1000 * resumeAttempts));
+          response = await fetch(
+            `https://perplexia.onrender.com/chat/stream/${streamId}`,
+            {
+              headers: {
+                Authorization: `Bearer ${localStorage.getItem("clerk-token")}`,
+                "Last-Event-ID": String(lastEventId),
+                // Identifies us without cookies, which this cross-origin request doesn't send
+                "X-Resume-Token": resumeToken,
+              },
+              signal: abortController.current.signal,
+            }
+          );
+          if (!response.ok) break;
         }
       } catch (error: unknown) {
         if (error instanceof Error && error.name !== "AbortError") {
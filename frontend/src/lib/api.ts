@@ -168,6 +168,30 @@ export const pdfApi = {
     });
   },
 
+  getUploadJob: (jobId: string) => api.get(`/pdf/jobs/${jobId}`),
+
+  // Poll an ingestion job until it finishes; resolves with the stored PDF
+  waitForUploadJob: async (
+    jobId: string,
+    onProgress?: (job: any) => void,
+    intervalMs = 1000
+  ) => {
+    while (true) {
+      const { data: job } = await api.get(`/pdf/jobs/${jobId}`);
+      onProgress?.(job);
+
+      // With warnings, the PDF is saved but its text can't be searched yet
+      if (job.status === "completed" || job.status === "completed_with_warnings") {
+        return job.result;
+      }
+      if (job.status === "failed") {
+        throw new Error(job.error || "Failed to process PDF");
+      }
+
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+  },
+
   listPdfs: () =>
     api.get("/pdf/list").then((response) => {
       // Ensure we always return an array